@@ -8,11 +8,14 @@ import json
 # Update this with your backend URL
 API_URL = "http://localhost:8000/api/products"
 
+# Reuse one keep-alive connection for every request
+SESSION = requests.Session()
+
 
 def add_product(product_data):
     """Add a product to the backend"""
     try:
-        response = requests.post(API_URL, json=product_data)
+        response = SESSION.post(API_URL, json=product_data)
         if response.status_code == 200:
             print(f"✓ Product '{product_data['name']}' added successfully!")
             return response.json()
@@ -24,6 +27,21 @@ def add_product(product_data):
         return None
 
 
+def add_products(products):
+    """Add several products to the backend in one request"""
+    try:
+        response = SESSION.post(f"{API_URL}/bulk", json=products)
+        if response.status_code == 200:
+            print(f"✓ {len(products)} products added successfully!")
+            return response.json()
+        else:
+            print(f"✗ Failed to add products: {response.text}")
+            return None
+    except Exception as e:
+        print(f"✗ Error: {e}")
+        return None
+
+
 # Example products to add
 EXAMPLE_PRODUCTS = [
     {
@@ -67,7 +85,7 @@ if __name__ == "__main__":
     
     # Check if server is running
     try:
-        requests.get("http://localhost:8000/docs")
+        SESSION.get("http://localhost:8000/docs")
     except:
         print("✗ Backend server not running!")
         print("Start it with: python -m backend.main")
@@ -81,8 +99,7 @@ if __name__ == "__main__":
     
     if choice == "1":
         print("\nAdding example products...")
-        for product in EXAMPLE_PRODUCTS:
-            add_product(product)
+        add_products(EXAMPLE_PRODUCTS)
     
     elif choice == "2":
         print("\nEnter product details:")
@@ -1,132 +1,434 @@
 """
 Database module for ShoFit backend
-Uses simple JSON file storage for development (can be replaced with SQL/MongoDB later)
+Uses SQLite storage (data/shofit.db); legacy JSON files are imported on first run
 """
 
 import json
 import os
-from typing import Optional, List, Dict
+import sqlite3
+import threading
+from bisect import bisect_left, bisect_right
+from typing import Optional, List, Dict, Iterator
 from datetime import datetime
 import hashlib
+import hmac
+
+from argon2 import PasswordHasher
+from argon2.exceptions import InvalidHashError, VerificationError
+
+try:
+    import orjson
+except ImportError:
+    orjson = None  # Fall back to the stdlib json module
+
+
+# Argon2id with a random salt stored in the encoded hash
+password_hasher = PasswordHasher()
+
+# Next to this module, so the database doesn't depend on the working directory
+DEFAULT_DATA_DIR = os.path.join(os.path.dirname(os.path.abspath(__file__)), "data")
 
 
 class Database:
-    def __init__(self, data_dir="data"):
+    SCHEMA_VERSION = 1
+
+    def __init__(self, data_dir=DEFAULT_DATA_DIR):
         self.data_dir = data_dir
         os.makedirs(data_dir, exist_ok=True)
+        self.db_file = os.path.join(data_dir, "shofit.db")
+        # Legacy JSON stores, only read to seed a fresh database
         self.users_file = os.path.join(data_dir, "users.json")
         self.products_file = os.path.join(data_dir, "products.json")
-        self._init_files()
+        # One connection shared by the request threadpool; every use of it (and
+        # of the in-memory tables below) happens under this lock
+        self._lock = threading.RLock()
+        self._connection: Optional[sqlite3.Connection] = None
+        # In-memory copies of the tables, dropped when another connection commits
+        self._data_version = None
+        self._products_cache: Optional[Dict[str, Dict]] = None
+        # Lookup structures over _products_cache, rebuilt after any change
+        self._product_index: Optional[Dict] = None
+        # Bumped on every product change, so callers can cache derived data
+        self._products_generation = 0
+        self._users_by_email: Optional[Dict[str, Dict]] = None
+        self._init_db()
+        self._load_users()
     
-    def _init_files(self):
-        """Initialize database files if they don't exist"""
-        if not os.path.exists(self.users_file):
-            self._save_json(self.users_file, {})
-        if not os.path.exists(self.products_file):
-            # Initialize with sample products
-            self._save_json(self.products_file, self._get_sample_products())
+    @property
+    def _conn(self) -> sqlite3.Connection:
+        """The shared connection, (re)opened on first use after close()"""
+        if self._connection is None:
+            conn = sqlite3.connect(self.db_file, check_same_thread=False)
+            conn.row_factory = sqlite3.Row
+            conn.execute("PRAGMA journal_mode=WAL")
+            conn.execute("PRAGMA synchronous=NORMAL")
+            # data_version is per connection, so revalidate the in-memory tables
+            self._data_version = None
+            self._connection = conn
+        return self._connection
+    
+    def _init_db(self):
+        """Create or migrate tables, seeding them on first run"""
+        version = self._conn.execute("PRAGMA user_version").fetchone()[0]
+        if version >= self.SCHEMA_VERSION:
+            return
+        
+        with self._conn:
+            if version < 1:
+                self._create_tables()
+            self._conn.execute(f"PRAGMA user_version = {self.SCHEMA_VERSION}")
+    
+    def _create_tables(self):
+        """Create the initial tables and import existing JSON data"""
+        self._conn.execute(
+            """
+            CREATE TABLE IF NOT EXISTS users (
+                email TEXT PRIMARY KEY,
+                id TEXT NOT NULL,
+                name TEXT NOT NULL,
+                password TEXT NOT NULL,
+                created_at TEXT NOT NULL
+            )
+            """
+        )
+        self._conn.execute(
+            """
+            CREATE TABLE IF NOT EXISTS products (
+                id TEXT PRIMARY KEY,
+                data TEXT NOT NULL
+            )
+            """
+        )
+        
+        # Import existing JSON data, falling back to sample products
+        users = self._load_json(self.users_file)
+        products = self._load_json(self.products_file) or self._get_sample_products()
+        self._conn.executemany(
+            "INSERT OR IGNORE INTO users (email, id, name, password, created_at) "
+            "VALUES (:email, :id, :name, :password, :created_at)",
+            users.values(),
+        )
+        self._conn.executemany(
+            "INSERT OR IGNORE INTO products (id, data) VALUES (?, ?)",
+            ((product_id, self._dumps(product)) for product_id, product in products.items()),
+        )
     
     def _load_json(self, filepath: str) -> dict:
         """Load JSON file"""
         try:
-            with open(filepath, 'r') as f:
-                return json.load(f)
+            with open(filepath, 'rb') as f:
+                return self._loads(f.read())
         except (FileNotFoundError, json.JSONDecodeError):
             return {}
     
-    def _save_json(self, filepath: str, data: dict):
-        """Save JSON file"""
-        with open(filepath, 'w') as f:
-            json.dump(data, f, indent=2)
+    @staticmethod
+    def _dumps(data: dict) -> str:
+        """Serialize a row as compact JSON (no indentation or spaces)"""
+        if orjson:
+            return orjson.dumps(data).decode()
+        return json.dumps(data, separators=(",", ":"))
+    
+    @staticmethod
+    def _loads(data):
+        """Parse a JSON row or file contents"""
+        if orjson:
+            return orjson.loads(data)
+        return json.loads(data)
+    
+    def _check_data_version(self):
+        """Drop the in-memory tables if another connection has committed"""
+        # data_version only changes on commits from other connections; our own
+        # writes update the cached dicts in place
+        version = self._conn.execute("PRAGMA data_version").fetchone()[0]
+        if version != self._data_version:
+            self._data_version = version
+            self._products_cache = None
+            self._users_by_email = None
+            self._products_changed()
+    
+    def _load_products(self) -> Dict[str, Dict]:
+        """Load products, reusing the parsed copy until another connection writes"""
+        self._check_data_version()
+        if self._products_cache is None:
+            rows = self._conn.execute("SELECT id, data FROM products ORDER BY rowid")
+            self._products_cache = {product_id: self._loads(data) for product_id, data in rows}
+        return self._products_cache
+    
+    def _products_changed(self):
+        """Drop data derived from the products cache after it changed"""
+        self._product_index = None
+        self._products_generation += 1
+    
+    def products_generation(self) -> int:
+        """Counter that changes whenever any product is added, updated or deleted"""
+        with self._lock:
+            self._check_data_version()
+            return self._products_generation
+    
+    def _load_product_index(self) -> Dict:
+        """
+        Build (once per change) the indexes used to filter product listings.
+        
+        Positions refer to the listing order. Prices are kept sorted for
+        bisection, and the lowercased name/brand text is computed once.
+        """
+        products = self._load_products()
+        if self._product_index is None:
+            ordered = list(products.values())
+            categories: Dict[str, List[int]] = {}
+            priced = []
+            search_text = []
+            for pos, product in enumerate(ordered):
+                category = product.get("category")
+                if isinstance(category, str):
+                    categories.setdefault(category.lower(), []).append(pos)
+                price = product.get("price")
+                if isinstance(price, (int, float)) and not isinstance(price, bool):
+                    priced.append((price, pos))
+                # Newline-separated so a search can't match across the two fields
+                search_text.append("\n".join(
+                    value.lower() for value in (product.get("name"), product.get("brand"))
+                    if isinstance(value, str)
+                ))
+            priced.sort()
+            self._product_index = {
+                "products": ordered,
+                "category": categories,
+                "price_keys": [price for price, _ in priced],
+                "price_positions": [pos for _, pos in priced],
+                "search_text": search_text,
+            }
+        return self._product_index
+    
+    def _load_users(self) -> Dict[str, Dict]:
+        """Load the email -> user index, kept in memory for the auth hot path"""
+        self._check_data_version()
+        if self._users_by_email is None:
+            rows = self._conn.execute("SELECT * FROM users ORDER BY rowid")
+            self._users_by_email = {row["email"]: dict(row) for row in rows}
+        return self._users_by_email
     
     @staticmethod
     def _hash_password(password: str) -> str:
-        """Hash password using SHA256"""
+        """Hash password using Argon2id"""
+        return password_hasher.hash(password)
+    
+    @staticmethod
+    def _legacy_hash_password(password: str) -> str:
+        """Unsalted SHA256 hash used by accounts created before Argon2"""
         return hashlib.sha256(password.encode()).hexdigest()
     
+    def _check_password(self, email: str, stored_hash: str, password: str) -> bool:
+        """Verify a password, upgrading legacy or outdated hashes on success"""
+        if stored_hash.startswith("$argon2"):
+            try:
+                password_hasher.verify(stored_hash, password)
+            except (VerificationError, InvalidHashError):
+                return False
+            needs_rehash = password_hasher.check_needs_rehash(stored_hash)
+        else:
+            if not hmac.compare_digest(stored_hash, self._legacy_hash_password(password)):
+                return False
+            needs_rehash = True
+        
+        if needs_rehash:
+            new_hash = self._hash_password(password)
+            with self._lock:
+                with self._conn:
+                    self._conn.execute(
+                        "UPDATE users SET password = ? WHERE email = ?",
+                        (new_hash, email),
+                    )
+                self._load_users()[email]["password"] = new_hash
+        return True
+    
+    @staticmethod
+    def _user_response(user: Dict) -> Dict:
+        """Copy a user record without the password"""
+        user_response = dict(user)
+        del user_response["password"]
+        return user_response
+    
     # User operations
+    # Password hashing is slow by design, so it runs outside the lock
     def create_user(self, email: str, name: str, password: str) -> Optional[Dict]:
         """Create a new user"""
-        users = self._load_json(self.users_file)
-        
-        if email in users:
-            return None  # User already exists
+        with self._lock:
+            if email in self._load_users():
+                return None  # User already exists
         
-        user_data = {
-            "id": str(len(users) + 1),
-            "email": email,
-            "name": name,
-            "password": self._hash_password(password),
-            "created_at": datetime.now().isoformat()
-        }
+        password_hash = self._hash_password(password)
+        with self._lock:
+            users = self._load_users()
+            user_data = {
+                "id": str(len(users) + 1),
+                "email": email,
+                "name": name,
+                "password": password_hash,
+                "created_at": datetime.now().isoformat()
+            }
+            with self._conn:
+                cursor = self._conn.execute(
+                    "INSERT OR IGNORE INTO users (email, id, name, password, created_at) "
+                    "VALUES (:email, :id, :name, :password, :created_at)",
+                    user_data,
+                )
+            if cursor.rowcount == 0:
+                return None  # Created concurrently
+            users[email] = user_data
         
-        users[email] = user_data
-        self._save_json(self.users_file, users)
-        
-        # Return user without password
-        user_response = user_data.copy()
-        del user_response["password"]
-        return user_response
+        return self._user_response(user_data)
     
     def get_user_by_email(self, email: str) -> Optional[Dict]:
         """Get user by email"""
-        users = self._load_json(self.users_file)
-        user = users.get(email)
-        if user:
-            user_response = user.copy()
-            del user_response["password"]
-            return user_response
+        with self._lock:
+            user = self._load_users().get(email)
+            if user:
+                return self._user_response(user)
         return None
     
     def verify_user(self, email: str, password: str) -> Optional[Dict]:
         """Verify user credentials"""
-        users = self._load_json(self.users_file)
-        user = users.get(email)
+        with self._lock:
+            user = self._load_users().get(email)
+            if not user:
+                return None  # Unknown email, skip hashing entirely
+            stored_hash = user["password"]
         
-        if user and user["password"] == self._hash_password(password):
-            user_response = user.copy()
-            del user_response["password"]
-            return user_response
-        return None
+        if not self._check_password(email, stored_hash, password):
+            return None
+        with self._lock:
+            return self._user_response(user)
     
     # Product operations
     def get_all_products(self) -> List[Dict]:
         """Get all products"""
-        products = self._load_json(self.products_file)
-        return list(products.values())
+        with self._lock:
+            return list(self._load_products().values())
+    
+    def get_products(
+        self,
+        offset: int = 0,
+        limit: Optional[int] = None,
+        category: Optional[str] = None,
+        min_price: Optional[float] = None,
+        max_price: Optional[float] = None,
+        search: Optional[str] = None,
+    ) -> List[Dict]:
+        """Get a page of products, filtered through the in-memory indexes"""
+        if not (offset or limit is not None or category or search
+                or min_price is not None or max_price is not None):
+            return self.get_all_products()
+        
+        # The index is replaced, never mutated, so it can be read unlocked
+        with self._lock:
+            index = self._load_product_index()
+        products = index["products"]
+        
+        positions = None  # None means every product, in listing order
+        if category:
+            positions = index["category"].get(category.lower(), [])
+        if min_price is not None or max_price is not None:
+            price_keys = index["price_keys"]
+            low = 0 if min_price is None else bisect_left(price_keys, min_price)
+            high = len(price_keys) if max_price is None else bisect_right(price_keys, max_price)
+            in_range = index["price_positions"][low:high]
+            if positions is not None:
+                in_range = set(in_range).intersection(positions)
+            positions = sorted(in_range)
+        if search:
+            needle = search.lower()
+            search_text = index["search_text"]
+            candidates = range(len(products)) if positions is None else positions
+            positions = [pos for pos in candidates if needle in search_text[pos]]
+        if positions is None:
+            positions = range(len(products))
+        
+        end = None if limit is None else offset + limit
+        return [products[pos] for pos in positions[offset:end]]
+    
+    def iter_products(self, batch_size: int = 100) -> Iterator[str]:
+        """Stream products as JSON text, without parsing them"""
+        # Separate cursor, advanced in batches so the lock is not held
+        # while the consumer handles rows
+        with self._lock:
+            cursor = self._conn.execute("SELECT data FROM products ORDER BY rowid")
+        while True:
+            with self._lock:
+                rows = cursor.fetchmany(batch_size)
+            if not rows:
+                return
+            for (data,) in rows:
+                yield data
     
     def get_product_by_id(self, product_id: str) -> Optional[Dict]:
         """Get product by ID"""
-        products = self._load_json(self.products_file)
-        return products.get(product_id)
+        with self._lock:
+            return self._load_products().get(product_id)
     
     def add_product(self, product_data: Dict) -> Dict:
         """Add a new product"""
-        products = self._load_json(self.products_file)
-        product_id = product_data.get("id", str(len(products) + 1))
-        product_data["id"] = product_id
-        products[product_id] = product_data
-        self._save_json(self.products_file, products)
-        return product_data
+        return self.add_products([product_data])[0]
+    
+    def add_products(self, products: List[Dict]) -> List[Dict]:
+        """Add several products in a single transaction"""
+        with self._lock:
+            with self._conn:
+                product_count = self._conn.execute("SELECT COUNT(*) FROM products").fetchone()[0]
+                for product_data in products:
+                    if "id" not in product_data:
+                        product_count += 1
+                        product_data["id"] = str(product_count)
+                # Upsert keeps the original rowid, so listing order is stable
+                self._conn.executemany(
+                    "INSERT INTO products (id, data) VALUES (?, ?) "
+                    "ON CONFLICT(id) DO UPDATE SET data = excluded.data",
+                    ((product_data["id"], self._dumps(product_data)) for product_data in products),
+                )
+            cached = self._load_products()
+            for product_data in products:
+                cached[product_data["id"]] = product_data
+            self._products_changed()
+        return products
     
     def update_product(self, product_id: str, product_data: Dict) -> Optional[Dict]:
         """Update an existing product"""
-        products = self._load_json(self.products_file)
-        if product_id not in products:
-            return None
         product_data["id"] = product_id
-        products[product_id] = product_data
-        self._save_json(self.products_file, products)
+        with self._lock:
+            with self._conn:
+                cursor = self._conn.execute(
+                    "UPDATE products SET data = ? WHERE id = ?",
+                    (self._dumps(product_data), product_id),
+                )
+            if cursor.rowcount == 0:
+                return None
+            self._load_products()[product_id] = product_data
+            self._products_changed()
         return product_data
     
     def delete_product(self, product_id: str) -> bool:
         """Delete a product"""
-        products = self._load_json(self.products_file)
-        if product_id in products:
-            del products[product_id]
-            self._save_json(self.products_file, products)
-            return True
-        return False
+        with self._lock:
+            with self._conn:
+                cursor = self._conn.execute("DELETE FROM products WHERE id = ?", (product_id,))
+            if cursor.rowcount == 0:
+                return False
+            self._load_products().pop(product_id, None)
+            self._products_changed()
+        return True
+    
+    def close(self):
+        """
+        Flush the WAL into the main database file and close the connection.
+        
+        Safe to call more than once; the next database access reconnects.
+        """
+        with self._lock:
+            if self._connection is None:
+                return
+            self._connection.execute("PRAGMA optimize")
+            self._connection.close()
+            self._connection = None
     
     @staticmethod
     def _get_sample_products() -> Dict:
@@ -0,0 +1,280 @@
+"""
+Image codec and MediaPipe pose helpers for the ShoFit backend
+
+Only needs OpenCV, NumPy and MediaPipe, so the POSE_PROCESS_WORKERS
+processes import this module instead of main and don't load the app,
+its routes or the database.
+"""
+
+import os
+import logging
+import threading
+from typing import Optional, Tuple
+
+import cv2
+import numpy as np
+
+try:
+    # Optional: PyTurboJPEG plus the system libturbojpeg library
+    from turbojpeg import TurboJPEG, TJSAMP_420
+    _TJ = TurboJPEG()
+except Exception:  # package missing, or libturbojpeg not found
+    _TJ = None
+
+logger = logging.getLogger(__name__)
+
+# MediaPipe Pose setup (lazy-loaded to avoid Windows import issues)
+mp = None
+POSE_EDGES = None
+BaseOptions = None
+PoseLandmarker = None
+PoseLandmarkerOptions = None
+VisionRunningMode = None
+# Why the MediaPipe import failed, reported when pose detection is unavailable
+_mediapipe_error: Optional[str] = None
+
+
+def init_mediapipe():
+    """Initialize MediaPipe on first use"""
+    global mp, POSE_EDGES, BaseOptions, PoseLandmarker, PoseLandmarkerOptions, VisionRunningMode, _mediapipe_error
+    if PoseLandmarker is None:
+        try:
+            # Import MediaPipe tasks API (0.10.x versions)
+            import mediapipe
+            from mediapipe.tasks import python
+            from mediapipe.tasks.python import vision
+            
+            mp = mediapipe
+            BaseOptions = python.BaseOptions
+            PoseLandmarker = vision.PoseLandmarker
+            PoseLandmarkerOptions = vision.PoseLandmarkerOptions
+            VisionRunningMode = vision.RunningMode
+            # Skeleton connections as an (edges, 2) array of landmark ids
+            POSE_EDGES = np.array(
+                [(c.start, c.end) for c in vision.PoseLandmarksConnections.POSE_LANDMARKS],
+                dtype=np.int32,
+            )
+            _mediapipe_error = None
+            
+            logger.info("MediaPipe initialized successfully (using tasks API)")
+        except Exception as e:
+            _mediapipe_error = str(e)
+            logger.error(f"Failed to initialize MediaPipe: {e}")
+            logger.info("MediaPipe features will be unavailable. Install with: pip install --upgrade mediapipe")
+            # Don't raise - allow app to continue without MediaPipe
+
+
+def pose_unavailable_reason(model_path: str) -> Optional[str]:
+    """Why pose detection can't run with this model (after init_mediapipe), or None if it can"""
+    if PoseLandmarker is None:
+        return f"MediaPipe could not be loaded ({_mediapipe_error or 'not initialized'})"
+    if not os.path.exists(model_path):
+        return f"pose model not found at {model_path}"
+    return None
+
+
+def create_pose_landmarker(model_path: str, use_gpu: bool = False):
+    """Build a PoseLandmarker, or return None if pose detection is unavailable"""
+    reason = pose_unavailable_reason(model_path)
+    if reason:
+        logger.warning(f"Pose detection will be unavailable: {reason}")
+        return None
+    
+    if use_gpu:
+        try:
+            landmarker = PoseLandmarker.create_from_options(_pose_landmarker_options(model_path, BaseOptions.Delegate.GPU))
+            logger.info(f"Pose landmarker loaded from {model_path} (GPU)")
+            return landmarker
+        except Exception as e:
+            logger.warning(f"GPU pose landmarker unavailable ({e}) - falling back to CPU")
+    
+    landmarker = PoseLandmarker.create_from_options(_pose_landmarker_options(model_path, BaseOptions.Delegate.CPU))
+    logger.info(f"Pose landmarker loaded from {model_path}")
+    return landmarker
+
+
+def _pose_landmarker_options(model_path: str, delegate):
+    return PoseLandmarkerOptions(
+        base_options=BaseOptions(model_asset_path=model_path, delegate=delegate),
+        running_mode=VisionRunningMode.IMAGE,
+        num_poses=1,
+        min_pose_detection_confidence=0.5,
+        # Only landmarks are used; skip the segmentation head
+        output_segmentation_masks=False,
+    )
+
+
+def decode_image(image_bytes, flags: int = cv2.IMREAD_COLOR) -> np.ndarray:
+    """
+    Decode raw JPEG/PNG bytes to an OpenCV image (BGR unless other
+    cv2.IMREAD_* flags are given), raising ValueError if that fails.
+    """
+    image = cv2.imdecode(np.frombuffer(image_bytes, np.uint8), flags)
+    if image is None:
+        raise ValueError("unsupported or corrupt image format")
+    return image
+
+
+def encode_image(image: np.ndarray, lossless: bool = False, quality: int = 88):
+    """
+    Encode an OpenCV image, returning the encoded bytes (or a uint8 array).
+    
+    Photos are encoded as JPEG (quality 88 by default); pass lossless=True
+    for PNG, which uses zlib's fastest level. JPEGs go through libjpeg-turbo
+    directly when PyTurboJPEG is available.
+    """
+    if lossless:
+        ok, buffer = cv2.imencode(".png", image, [cv2.IMWRITE_PNG_COMPRESSION, 1])
+    elif _TJ is not None:
+        return _TJ.encode(image, quality=quality, jpeg_subsample=TJSAMP_420)
+    else:
+        ok, buffer = cv2.imencode(".jpg", image, [cv2.IMWRITE_JPEG_QUALITY, quality, cv2.IMWRITE_JPEG_OPTIMIZE, 1])
+    if not ok:
+        raise RuntimeError("Could not encode image")
+    return buffer
+
+
+def landmarks_to_array(landmarks) -> np.ndarray:
+    """
+    Copy detected pose landmarks into one array, so drawing doesn't walk
+    the landmark objects again.
+    
+    Returns:
+        (len(landmarks), 4) float64 array of normalized (x, y, visibility,
+        presence); a missing visibility or presence counts as 1.0
+    """
+    return np.fromiter(
+        (
+            c
+            for landmark in landmarks
+            for c in (
+                landmark.x,
+                landmark.y,
+                1.0 if landmark.visibility is None else landmark.visibility,
+                1.0 if landmark.presence is None else landmark.presence,
+            )
+        ),
+        dtype=np.float64,
+        count=4 * len(landmarks),
+    ).reshape(-1, 4)
+
+
+def landmarks_to_pixels(landmarks: np.ndarray, height: int, width: int) -> np.ndarray:
+    """
+    Convert a landmarks_to_array() result to pixel coordinates.
+    
+    Returns:
+        (len(landmarks), 2) float64 array of (x, y) pixel positions
+    """
+    return landmarks[:, :2] * (width, height)
+
+
+# The pose models run at 256x256, so phone photos are shrunk to this long side
+# before detection. Landmarks are normalized to the frame, so measurements
+# and drawing still use the full-resolution image.
+POSE_INPUT_MAX_SIDE = 720
+
+# Per-thread RGB input buffer for detect_pose, reused while frame sizes repeat
+_pose_input = threading.local()
+
+
+def _pose_input_buffer(shape) -> np.ndarray:
+    buffer = getattr(_pose_input, "buffer", None)
+    if buffer is None or buffer.shape != shape:
+        buffer = _pose_input.buffer = np.empty(shape, np.uint8)
+    return buffer
+
+
+def detect_pose(landmarker, image: np.ndarray):
+    """Run a PoseLandmarker on a BGR image (MediaPipe expects RGB)."""
+    height, width = image.shape[:2]
+    scale = POSE_INPUT_MAX_SIDE / max(height, width)
+    if scale < 1:
+        size = (max(1, round(width * scale)), max(1, round(height * scale)))
+        image_rgb = _pose_input_buffer((size[1], size[0], 3))
+        cv2.resize(image, size, dst=image_rgb, interpolation=cv2.INTER_AREA)
+        cv2.cvtColor(image_rgb, cv2.COLOR_BGR2RGB, dst=image_rgb)
+    else:
+        image_rgb = _pose_input_buffer(image.shape)
+        cv2.cvtColor(image, cv2.COLOR_BGR2RGB, dst=image_rgb)
+    # mp.Image copies the pixels, so the buffer is free again right away
+    return landmarker.detect(mp.Image(image_format=mp.ImageFormat.SRGB, data=image_rgb))
+
+
+# Landmarks less visible/present than this are not drawn (as in MediaPipe's drawing_utils)
+LANDMARK_DRAW_THRESHOLD = 0.5
+
+
+def draw_pose(image: np.ndarray, landmarks: np.ndarray) -> None:
+    """
+    Draw pose landmarks (a landmarks_to_array() result) and connections
+    onto a BGR image, in place.
+    
+    Produces the same picture as mp drawing_utils.draw_landmarks, but with
+    one polylines call for the whole skeleton.
+    """
+    height, width = image.shape[:2]
+    pts = landmarks_to_pixels(landmarks, height, width)
+    
+    # Skip landmarks that are hidden, unlikely or outside the frame
+    visible = (landmarks[:, 2:] >= LANDMARK_DRAW_THRESHOLD).all(axis=1)
+    visible &= ((pts >= 0) & (pts <= (width, height))).all(axis=1)
+    pts = np.minimum(pts, (width - 1, height - 1)).astype(np.int32)
+    
+    # Connections whose both ends are visible, drawn in one call
+    edges = POSE_EDGES[visible[POSE_EDGES].all(axis=1)]
+    cv2.polylines(image, pts[edges], False, (255, 0, 0), 2)
+    
+    # Joints on top: light border, then the green fill
+    circle = cv2.circle
+    for point in map(tuple, pts[visible].tolist()):
+        circle(image, point, 3, (224, 224, 224), 2)
+        circle(image, point, 2, (0, 255, 0), 2)
+
+
+class PoseUnavailableError(RuntimeError):
+    """Raised in a pose worker whose landmarker could not be loaded"""
+
+
+# Landmarker owned by a pose worker process, or why it couldn't be loaded
+_worker_landmarker = None
+_worker_error: Optional[str] = None
+
+
+def init_pose_worker(model_path: str, use_gpu: bool = False):
+    """
+    ProcessPoolExecutor initializer: load this worker's landmarker once.
+    
+    Load errors are kept for analyze_pose_in_worker to report rather than
+    raised here, which would break the whole pool.
+    """
+    global _worker_landmarker, _worker_error
+    init_mediapipe()
+    try:
+        _worker_landmarker = create_pose_landmarker(model_path, use_gpu)
+    except Exception as e:
+        logger.error(f"Failed to load pose landmarker: {e}")
+        _worker_error = f"pose landmarker failed to load ({e})"
+        return
+    if _worker_landmarker is None:
+        _worker_error = pose_unavailable_reason(model_path)
+
+
+def analyze_pose_in_worker(image_bytes: bytes) -> Optional[Tuple[Tuple[int, int], bytes]]:
+    """
+    Detect and draw the pose for /analyze-pose inside a pose worker process.
+    
+    Takes and returns encoded images so only compressed bytes cross the
+    process boundary. Returns the image's (height, width) and the annotated
+    image, or None if no pose was found. Raises ValueError if the image
+    can't be decoded, and PoseUnavailableError if this worker has no
+    landmarker.
+    """
+    if _worker_landmarker is None:
+        raise PoseUnavailableError(f"Pose detection is unavailable in this worker: {_worker_error}")
+    image = decode_image(image_bytes)
+    results = detect_pose(_worker_landmarker, image)
+    if not results.pose_landmarks:
+        return None
+    draw_pose(image, landmarks_to_array(results.pose_landmarks[0]))
+    return image.shape[:2], bytes(encode_image(image))
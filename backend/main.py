@@ -4,24 +4,61 @@ Phase 2 & 4: MediaPipe Pose measurements + OOTDiffusion + HunyuanVideo
 """
 
 import os
-import io
-import base64
+import time
+import asyncio
+import hashlib
 import logging
-from typing import Optional
+import functools
+import multiprocessing
+from typing import Optional, Tuple, Union
+from collections import OrderedDict
 from contextlib import asynccontextmanager
+from concurrent.futures import ProcessPoolExecutor, ThreadPoolExecutor
+from concurrent.futures.process import BrokenProcessPool
 
 import cv2
 import numpy as np
-from PIL import Image
-from fastapi import FastAPI, HTTPException
+from fastapi import FastAPI, File, Form, HTTPException, UploadFile
 from fastapi.middleware.cors import CORSMiddleware
+from fastapi.responses import ORJSONResponse, Response
 from pydantic import BaseModel, Field
 import httpx
+import orjson
 from dotenv import load_dotenv
 
+try:
+    import pybase64 as base64  # SIMD-accelerated drop-in for the stdlib module
+    # Encodes straight to str, without an intermediate bytes object
+    b64encode_str = base64.b64encode_as_string
+except ImportError:
+    import base64
+    
+    def b64encode_str(data) -> str:
+        return base64.b64encode(data).decode("ascii")
+
+try:
+    import h2  # noqa: F401  (lets httpx speak HTTP/2)
+    HTTP2_AVAILABLE = True
+except ImportError:
+    HTTP2_AVAILABLE = False
+
 # Import routes
 from routes.products import router as products_router
 from routes.auth import router as auth_router
+from database import db
+from imaging import (
+    PoseUnavailableError,
+    analyze_pose_in_worker,
+    create_pose_landmarker,
+    decode_image,
+    detect_pose,
+    draw_pose,
+    encode_image,
+    init_mediapipe,
+    init_pose_worker,
+    landmarks_to_array,
+    pose_unavailable_reason,
+)
 
 # Load environment variables
 BASE_DIR = os.path.dirname(__file__)
@@ -32,51 +69,127 @@ load_dotenv(os.path.join(BASE_DIR, "..", ".env"))
 logging.basicConfig(level=logging.INFO)
 logger = logging.getLogger(__name__)
 
-# MediaPipe Pose setup (lazy-loaded to avoid Windows import issues)
-mp_pose = None
-mp_drawing = None
-PoseLandmarker = None
-PoseLandmarkerOptions = None
-VisionRunningMode = None
-
-def _init_mediapipe():
-    """Initialize MediaPipe on first use"""
-    global mp_pose, mp_drawing, PoseLandmarker, PoseLandmarkerOptions, VisionRunningMode
-    if PoseLandmarker is None:
-        try:
-            # Import MediaPipe tasks API (0.10.x versions)
-            from mediapipe.tasks import python
-            from mediapipe.tasks.python import vision
-            
-            PoseLandmarker = vision.PoseLandmarker
-            PoseLandmarkerOptions = vision.PoseLandmarkerOptions
-            VisionRunningMode = vision.RunningMode
-            
-            # Also try to import old API for drawing utilities
+# PoseLandmarker model bundle from
+# https://ai.google.dev/edge/mediapipe/solutions/vision/pose_landmarker
+# POSE_MODEL_COMPLEXITY picks the default bundle like the old Pose
+# model_complexity did: 0 = lite, 1 = full, 2 = heavy. Full is several
+# times faster than heavy on CPU with similar landmarks on full-body shots.
+POSE_MODEL_VARIANTS = ("lite", "full", "heavy")
+POSE_MODEL_COMPLEXITY = min(max(int(os.getenv("POSE_MODEL_COMPLEXITY", "1")), 0), 2)
+POSE_MODEL_PATH = os.getenv(
+    "POSE_MODEL_PATH",
+    os.path.join(BASE_DIR, "weights", f"pose_landmarker_{POSE_MODEL_VARIANTS[POSE_MODEL_COMPLEXITY]}.task"),
+)
+# Number of landmarkers kept loaded, i.e. how many pose requests can run at once
+POSE_POOL_SIZE = max(1, int(os.getenv("POSE_POOL_SIZE", "2")))
+# When > 0, /analyze-pose runs in this many worker processes (each with its
+# own landmarker) instead of the in-process pool, so pose work isn't bound
+# by the server's GIL. Each worker loads its own copy of the model.
+POSE_PROCESS_WORKERS = max(0, int(os.getenv("POSE_PROCESS_WORKERS", "0")))
+# Run pose inference on the GPU delegate (needs a GPU-enabled MediaPipe
+# wheel and drivers); falls back to CPU if the delegate can't be created
+MEDIAPIPE_USE_GPU = os.getenv("MEDIAPIPE_USE_GPU", "0").lower() in ("1", "true", "yes")
+
+
+class PoseLandmarkerPool:
+    """
+    Fixed set of PoseLandmarker instances shared by all requests.
+    
+    A landmarker must not run two detections at once, so each request
+    checks one out exclusively and waits when all of them are busy. The
+    landmarker goes back to the pool when its detection thread finishes,
+    not when the request does: a cancelled request can't stop a detection
+    that is already running.
+    """
+    
+    def __init__(self, landmarkers: list):
+        self._landmarkers = landmarkers
+        self._idle = asyncio.Queue()
+        for landmarker in landmarkers:
+            self._idle.put_nowait(landmarker)
+    
+    async def detect(self, image: np.ndarray):
+        """Run detect_pose on an idle landmarker in a worker thread."""
+        landmarker = await self._idle.get()
+        loop = asyncio.get_running_loop()
+        
+        def run():
             try:
-                import mediapipe as mp
-                mp_drawing = mp.solutions.drawing_utils
-                mp_pose = mp.solutions.pose
-            except:
-                pass
-            
-            logger.info("MediaPipe initialized successfully (using tasks API)")
-        except Exception as e:
-            logger.error(f"Failed to initialize MediaPipe: {e}")
-            logger.info("MediaPipe features will be unavailable. Install with: pip install --upgrade mediapipe")
-            # Don't raise - allow app to continue without MediaPipe
+                return detect_pose(landmarker, image)
+            finally:
+                loop.call_soon_threadsafe(self._idle.put_nowait, landmarker)
+        
+        # Shielded so cancelling the request can't drop the job before it
+        # starts, which would leave the landmarker checked out for good
+        return await asyncio.shield(loop.run_in_executor(None, run))
+    
+    def close(self):
+        for landmarker in self._landmarkers:
+            landmarker.close()
+
+
+def _create_pose_pool() -> Optional[PoseLandmarkerPool]:
+    """Load POSE_POOL_SIZE landmarkers, or return None if pose detection is unavailable"""
+    first = create_pose_landmarker(POSE_MODEL_PATH, MEDIAPIPE_USE_GPU)
+    if first is None:
+        return None
+    landmarkers = [first] + [
+        create_pose_landmarker(POSE_MODEL_PATH, MEDIAPIPE_USE_GPU) for _ in range(POSE_POOL_SIZE - 1)
+    ]
+    return PoseLandmarkerPool(landmarkers)
+
+
+def _create_pose_processes() -> Optional[ProcessPoolExecutor]:
+    """Start the pose worker processes, or return None if pose detection is unavailable"""
+    reason = pose_unavailable_reason(POSE_MODEL_PATH)
+    if reason:
+        logger.warning(f"Pose detection will be unavailable: {reason}")
+        return None
+    # spawn: forking the running server (event loop, executor threads) isn't safe.
+    # Workers only import the imaging module, not this app or its database
+    return ProcessPoolExecutor(
+        max_workers=POSE_PROCESS_WORKERS,
+        mp_context=multiprocessing.get_context("spawn"),
+        initializer=init_pose_worker,
+        initargs=(POSE_MODEL_PATH, MEDIAPIPE_USE_GPU),
+    )
 
 
 @asynccontextmanager
 async def lifespan(app: FastAPI):
     """Lifespan context manager for startup/shutdown events."""
     logger.info("Starting ShoFit Backend...")
+    # Image decoding, pose detection and encoding run via asyncio.to_thread;
+    # size the pool to the CPU rather than asyncio's min(32, cpus + 4) default
+    asyncio.get_running_loop().set_default_executor(ThreadPoolExecutor(max_workers=os.cpu_count()))
+    app.state.pose_pool = None
+    app.state.pose_processes = None
     try:
-        _init_mediapipe()
+        init_mediapipe()
+        if POSE_PROCESS_WORKERS:
+            app.state.pose_processes = _create_pose_processes()
+        else:
+            app.state.pose_pool = _create_pose_pool()
     except Exception as e:
         logger.warning(f"MediaPipe initialization warning: {e}")
+    # One pooled client for all outbound calls, so Hugging Face requests
+    # reuse open connections instead of paying a TLS handshake each time
+    app.state.http = httpx.AsyncClient(
+        limits=httpx.Limits(max_connections=64, max_keepalive_connections=32, keepalive_expiry=30),
+        timeout=httpx.Timeout(120.0, connect=10.0),
+        http2=HTTP2_AVAILABLE,
+    )
+    # Validate the HF token once in the background instead of on every try-on
+    hf_token_check = asyncio.create_task(check_hf_token(app.state.http))
     yield
     logger.info("Shutting down ShoFit Backend...")
+    hf_token_check.cancel()
+    await app.state.http.aclose()
+    if app.state.pose_pool:
+        app.state.pose_pool.close()
+    if app.state.pose_processes:
+        app.state.pose_processes.shutdown(cancel_futures=True)
+    db.close()
 
 
 # FastAPI app
@@ -85,15 +198,59 @@ app = FastAPI(
     description="Body measurement and virtual try-on API using MediaPipe and AI models",
     version="1.0.0",
     lifespan=lifespan,
+    # orjson serializes the large base64 image fields much faster than stdlib json
+    default_response_class=ORJSONResponse,
 )
 
-# CORS middleware
+# Upload limits: ~20M base64 chars is ~15 MB decoded per image, and a
+# request body may carry a couple of images plus JSON overhead
+MAX_IMAGE_BASE64_CHARS = 20_000_000
+MAX_IMAGE_BYTES = MAX_IMAGE_BASE64_CHARS * 3 // 4
+MAX_REQUEST_BODY_BYTES = 30 * 1024 * 1024
+
+
+class RequestBodyLimitMiddleware:
+    """
+    Reject oversized uploads from the Content-Length header, before the body is read.
+    
+    Plain ASGI rather than @app.middleware("http"), which would wrap every
+    request (cached product GETs included) in an extra task and stream.
+    """
+    
+    def __init__(self, app, max_body_bytes: int):
+        self.app = app
+        self.max_body_bytes = max_body_bytes
+    
+    async def __call__(self, scope, receive, send):
+        if scope["type"] == "http":
+            for name, value in scope["headers"]:
+                if name == b"content-length":
+                    if value.isdigit() and int(value) > self.max_body_bytes:
+                        response = ORJSONResponse(status_code=413, content={"detail": "Request body too large"})
+                        await response(scope, receive, send)
+                        return
+                    break
+        await self.app(scope, receive, send)
+
+
+app.add_middleware(RequestBodyLimitMiddleware, max_body_bytes=MAX_REQUEST_BODY_BYTES)
+
+
+# CORS middleware (added after the size limit so it wraps 413 responses too).
+# A fixed origin list plus max_age lets browsers cache preflights for a day;
+# native app requests carry no Origin and are unaffected.
+CORS_ORIGINS = [
+    origin.strip()
+    for origin in os.getenv("CORS_ORIGINS", "http://localhost:8081,http://localhost:19006").split(",")
+    if origin.strip()
+]
 app.add_middleware(
     CORSMiddleware,
-    allow_origins=["*"],  # In production, specify allowed origins
+    allow_origins=CORS_ORIGINS,
     allow_credentials=True,
-    allow_methods=["*"],
-    allow_headers=["*"],
+    allow_methods=["GET", "POST", "PUT", "DELETE"],
+    allow_headers=["authorization", "content-type"],
+    max_age=86400,
 )
 
 # Include routers
@@ -107,8 +264,8 @@ app.include_router(auth_router)
 
 class MeasurementRequest(BaseModel):
     """Request model for body measurement."""
-    image_base64: str = Field(..., description="Base64 encoded full-body front image")
-    side_image_base64: Optional[str] = Field(None, description="Base64 encoded side view image")
+    image_base64: str = Field(..., max_length=MAX_IMAGE_BASE64_CHARS, description="Base64 encoded full-body front image")
+    side_image_base64: Optional[str] = Field(None, max_length=MAX_IMAGE_BASE64_CHARS, description="Base64 encoded side view image")
     height_cm: float = Field(..., gt=0, description="User's height in centimeters")
 
 
@@ -120,7 +277,7 @@ class MeasurementResponse(BaseModel):
     hips_cm: float
     waist_to_hip_ratio: float
     height_cm: float
-    annotated_image: Optional[str] = Field(None, description="Base64 encoded image with measurement points")
+    annotated_image: Optional[str] = Field(None, description="Base64 encoded JPEG image with measurement points")
     shoulder_width_px: Optional[float] = None
     chest_width_px: Optional[float] = None
     waist_width_px: Optional[float] = None
@@ -130,15 +287,16 @@ class MeasurementResponse(BaseModel):
 
 class VirtualTryOnRequest(BaseModel):
     """Request model for virtual try-on."""
-    person_image_base64: str = Field(..., description="Base64 encoded person image")
+    person_image_base64: str = Field(..., max_length=MAX_IMAGE_BASE64_CHARS, description="Base64 encoded person image")
     clothing_url: str = Field(default="", description="URL of the clothing item")
-    clothing_image_base64: Optional[str] = Field(None, description="Base64 encoded clothing image (optional)")
+    clothing_image_base64: Optional[str] = Field(None, max_length=MAX_IMAGE_BASE64_CHARS, description="Base64 encoded clothing image (optional)")
     category: str = Field(default="Upper body", description="Garment category: 'Upper body', 'Lower body', or 'Dress'")
 
 
 class VirtualTryOnResponse(BaseModel):
     """Response model for virtual try-on."""
     result_image_base64: str
+    result_id: Optional[str] = Field(None, description="Id for fetching the result as raw image bytes from /virtual-tryon/{result_id}/image")
     video_url: Optional[str] = None
     message: str
 
@@ -147,63 +305,98 @@ class VirtualTryOnResponse(BaseModel):
 # Helper Functions
 # ============================================================================
 
+def strip_data_url_prefix(base64_string: str) -> str:
+    """Drop a "data:<mime>;base64," prefix, copying the payload only once."""
+    comma = base64_string.find(",")
+    return base64_string[comma + 1:] if comma >= 0 else base64_string
+
+
 def decode_base64_image(base64_string: str) -> np.ndarray:
-    """Decode a base64 string to an OpenCV image."""
+    """
+    Decode a base64 string to an OpenCV image.
+    
+    Images stay BGR (OpenCV's native layout) throughout the backend; only
+    the copy handed to MediaPipe is converted to RGB.
+    """
+    return decode_image_bytes(decode_base64_bytes(base64_string))
+
+
+def decode_base64_bytes(base64_string: str) -> bytes:
+    """Decode a base64 image string (with or without a data URL prefix) to raw bytes."""
+    # Fail before allocating anything for oversized payloads
+    if len(base64_string) > MAX_IMAGE_BASE64_CHARS:
+        raise HTTPException(status_code=413, detail="Image too large")
     try:
-        # Remove data URL prefix if present
-        if "," in base64_string:
-            base64_string = base64_string.split(",")[1]
-        
-        image_bytes = base64.b64decode(base64_string)
-        image = Image.open(io.BytesIO(image_bytes))
-        image_rgb = image.convert("RGB")
-        return cv2.cvtColor(np.array(image_rgb), cv2.COLOR_RGB2BGR)
+        return base64.b64decode(strip_data_url_prefix(base64_string))
     except Exception as e:
         logger.error(f"Error decoding image: {e}")
         raise HTTPException(status_code=400, detail=f"Invalid image data: {str(e)}")
 
 
-def encode_image_to_base64(image: np.ndarray, format: str = "PNG") -> str:
-    """Encode an OpenCV image to base64 string."""
-    image_rgb = cv2.cvtColor(image, cv2.COLOR_BGR2RGB)
-    pil_image = Image.fromarray(image_rgb)
-    buffer = io.BytesIO()
-    pil_image.save(buffer, format=format)
-    return base64.b64encode(buffer.getvalue()).decode("utf-8")
+def decode_image_bytes(image_bytes, flags: int = cv2.IMREAD_COLOR) -> np.ndarray:
+    """Decode raw JPEG/PNG bytes to a BGR (or, with other flags, as-is) OpenCV image."""
+    try:
+        return decode_image(image_bytes, flags)
+    except Exception as e:
+        logger.error(f"Error decoding image: {e}")
+        raise HTTPException(status_code=400, detail=f"Invalid image data: {str(e)}")
 
 
-def calculate_distance(point1: tuple, point2: tuple) -> float:
-    """Calculate Euclidean distance between two points."""
-    return np.sqrt((point1[0] - point2[0])**2 + (point1[1] - point2[1])**2)
+def image_media_type(image_bytes: bytes) -> str:
+    """MIME type of an encoded image: PNG when it has the PNG signature, else JPEG."""
+    return "image/png" if image_bytes.startswith(b"\x89PNG") else "image/jpeg"
 
 
-def get_landmark_coordinates(landmarks, landmark_id: int, image_shape: tuple) -> tuple:
-    """Get pixel coordinates for a landmark."""
-    landmark = landmarks[landmark_id]
-    height, width = image_shape[:2]
-    return (int(landmark.x * width), int(landmark.y * height))
+async def read_upload(upload: UploadFile) -> bytes:
+    """Read an uploaded file, rejecting anything over MAX_IMAGE_BYTES."""
+    data = await upload.read(MAX_IMAGE_BYTES + 1)
+    if len(data) > MAX_IMAGE_BYTES:
+        raise HTTPException(status_code=413, detail="Image too large")
+    return data
+
+
+def encode_image_to_base64(image: np.ndarray, lossless: bool = False, quality: int = 88) -> str:
+    """
+    Encode an OpenCV image to base64 string.
+    
+    JPEG (quality 88) by default, or PNG with lossless=True; see
+    imaging.encode_image.
+    """
+    try:
+        return b64encode_str(encode_image(image, lossless=lossless, quality=quality))
+    except RuntimeError as e:
+        raise HTTPException(status_code=500, detail=str(e))
 
 
 # ============================================================================
 # Body Measurement Functions (Phase 2)
 # ============================================================================
 
-def extract_body_measurements_px(image: np.ndarray) -> dict:
+# Measurement lines drawn by create_annotated_image: (label, measurement key, y ratio)
+# Shoulders - top 15% of image (adjusted for head), Bust - 25% down (chest area),
+# Waist - 45% down (natural waist), Hips - 60% down (widest part of hips)
+ANNOTATION_LINES = (
+    ("Shoulders", "shoulder_width_px", 0.15),
+    ("Bust", "chest_width_px", 0.25),
+    ("Waist", "waist_width_px", 0.45),
+    ("Hips", "hip_width_px", 0.60),
+)
+ANNOTATION_Y_RATIOS = np.array([ratio for _, _, ratio in ANNOTATION_LINES])
+
+
+@functools.lru_cache(maxsize=32)
+def _frame_geometry(height: int, width: int) -> tuple:
     """
-    Extract body measurements in pixels using simple estimation.
+    Compute the resolution-dependent geometry once per frame size.
     
-    Returns measurements for:
-    - Shoulder width (estimated from image width)
-    - Chest/bust width
-    - Waist width  
-    - Hip width
-    - Body height (image height)
+    Phone captures cluster around a few resolutions, so this is shared by
+    extract_body_measurements_px and create_annotated_image.
     
-    Note: This is a simplified version. For more accurate measurements,
-    MediaPipe Pose detection should be used.
+    Returns:
+        (measurements_px, center_x, line_ys): estimated pixel measurements as
+        (key, value) pairs, the center column, and a read-only array with
+        the y coordinate of each ANNOTATION_LINES row
     """
-    height, width = image.shape[:2]
-    
     # Simple estimations based on typical body proportions
     # These are rough estimates - real pose detection would be more accurate
     
@@ -221,13 +414,56 @@ def extract_body_measurements_px(image: np.ndarray) -> dict:
     # Body height is approximately the full image height
     body_height_px = height * 0.9  # Assume person fills 90% of frame
     
-    return {
-        "shoulder_width_px": shoulder_width_px,
-        "chest_width_px": chest_width_px,
-        "waist_width_px": waist_width_px,
-        "hip_width_px": hip_width_px,
-        "body_height_px": body_height_px,
-    }
+    measurements_px = (
+        ("shoulder_width_px", shoulder_width_px),
+        ("chest_width_px", chest_width_px),
+        ("waist_width_px", waist_width_px),
+        ("hip_width_px", hip_width_px),
+        ("body_height_px", body_height_px),
+    )
+    
+    line_ys = (height * ANNOTATION_Y_RATIOS).astype(np.int32)
+    line_ys.flags.writeable = False
+    return measurements_px, width // 2, line_ys
+
+
+def extract_body_measurements_px(image: np.ndarray) -> dict:
+    """
+    Extract body measurements in pixels using simple estimation.
+    
+    Returns measurements for:
+    - Shoulder width (estimated from image width)
+    - Chest/bust width
+    - Waist width  
+    - Hip width
+    - Body height (image height)
+    
+    Note: This is a simplified version. For more accurate measurements,
+    MediaPipe Pose detection should be used.
+    """
+    height, width = image.shape[:2]
+    measurements_px, _, _ = _frame_geometry(height, width)
+    return dict(measurements_px)
+
+
+# Width measurements handled by the pixel-to-cm conversion, in array column order
+WIDTH_PX_KEYS = ("shoulder_width_px", "chest_width_px", "waist_width_px", "hip_width_px")
+
+def convert_pixels_to_cm_batch(widths_px: np.ndarray, body_heights_px: np.ndarray, user_heights_cm) -> np.ndarray:
+    """
+    Convert a batch of pixel width measurements to centimeters.
+    
+    Args:
+        widths_px: (N, 4) array of widths in WIDTH_PX_KEYS order
+        body_heights_px: (N,) array of body heights in pixels
+        user_heights_cm: (N,) array or scalar of users' heights in centimeters
+    
+    Returns:
+        (N, 4) array of unrounded widths in centimeters
+    """
+    # Scale factor per row: cm per pixel
+    cm_per_pixel = np.asarray(user_heights_cm, dtype=np.float64) / np.asarray(body_heights_px, dtype=np.float64)
+    return np.asarray(widths_px, dtype=np.float64) * cm_per_pixel[..., None]
 
 
 def convert_pixels_to_cm(measurements_px: dict, user_height_cm: float) -> dict:
@@ -241,93 +477,72 @@ def convert_pixels_to_cm(measurements_px: dict, user_height_cm: float) -> dict:
     Returns:
         Dictionary with centimeter measurements
     """
-    # Calculate scale factor: cm per pixel
     if measurements_px["body_height_px"] <= 0:
         raise HTTPException(
             status_code=400,
             detail="Could not calculate body height from image."
         )
     
-    cm_per_pixel = user_height_cm / measurements_px["body_height_px"]
-    
-    shoulder_width_cm = measurements_px["shoulder_width_px"] * cm_per_pixel
-    chest_width_cm = measurements_px["chest_width_px"] * cm_per_pixel
-    waist_width_cm = measurements_px["waist_width_px"] * cm_per_pixel
-    hip_width_cm = measurements_px["hip_width_px"] * cm_per_pixel
+    widths_px = np.array([[measurements_px[key] for key in WIDTH_PX_KEYS]])
+    widths_cm = convert_pixels_to_cm_batch(widths_px, np.array([measurements_px["body_height_px"]]), user_height_cm)[0]
     
     # Calculate waist-to-hip ratio
+    waist_width_cm, hip_width_cm = widths_cm[2], widths_cm[3]
     waist_to_hip_ratio = waist_width_cm / hip_width_cm if hip_width_cm > 0 else 0
     
     # Return with field names expected by frontend
+    shoulders_cm, bust_cm, waist_cm, hips_cm = np.round(widths_cm, 1).tolist()
     return {
-        "shoulders_cm": round(shoulder_width_cm, 1),
-        "bust_cm": round(chest_width_cm, 1),
-        "waist_cm": round(waist_width_cm, 1),
-        "hips_cm": round(hip_width_cm, 1),
-        "waist_to_hip_ratio": round(waist_to_hip_ratio, 3),
+        "shoulders_cm": shoulders_cm,
+        "bust_cm": bust_cm,
+        "waist_cm": waist_cm,
+        "hips_cm": hips_cm,
+        "waist_to_hip_ratio": round(float(waist_to_hip_ratio), 3),
         "height_cm": user_height_cm,
     }
 
 
-def create_annotated_image(image: np.ndarray, measurements_px: dict) -> str:
+def create_annotated_image(image: np.ndarray, measurements_px: dict, inplace: bool = False) -> str:
     """
     Create an annotated image with measurement points drawn.
     
     Args:
         image: Original image
         measurements_px: Pixel measurements
+        inplace: Draw directly on ``image`` instead of a copy. Only use this
+            when the caller no longer needs the original pixels.
     
     Returns:
         Base64 encoded annotated image
     """
-    # Create a copy to draw on
-    annotated = image.copy()
+    annotated = image if inplace else image.copy()
     height, width = image.shape[:2]
+    _, center_x, line_ys = _frame_geometry(height, width)
     
-    # Calculate approximate positions for measurement points
-    center_x = width // 2
-    
-    # Shoulders - top 15% of image (adjusted for head)
-    shoulder_y = int(height * 0.15)
-    shoulder_width = int(measurements_px["shoulder_width_px"])
-    left_shoulder = (center_x - shoulder_width // 2, shoulder_y)
-    right_shoulder = (center_x + shoulder_width // 2, shoulder_y)
-    
-    # Bust - 25% down (chest area)
-    bust_y = int(height * 0.25)
-    bust_width = int(measurements_px["chest_width_px"])
-    left_bust = (center_x - bust_width // 2, bust_y)
-    right_bust = (center_x + bust_width // 2, bust_y)
-    
-    # Waist - 45% down (natural waist)
-    waist_y = int(height * 0.45)
-    waist_width = int(measurements_px["waist_width_px"])
-    left_waist = (center_x - waist_width // 2, waist_y)
-    right_waist = (center_x + waist_width // 2, waist_y)
-    
-    # Hips - 60% down (widest part of hips)
-    hip_y = int(height * 0.60)
-    hip_width = int(measurements_px["hip_width_px"])
-    left_hip = (center_x - hip_width // 2, hip_y)
-    right_hip = (center_x + hip_width // 2, hip_y)
+    # Calculate approximate positions for measurement points as an
+    # (lines, endpoints, xy) array: [[left, right], ...] for each measurement
+    half_widths = np.array(
+        [int(measurements_px[key]) for _, key, _ in ANNOTATION_LINES], dtype=np.int32
+    ) // 2
+    lines = np.empty((len(ANNOTATION_LINES), 2, 2), dtype=np.int32)
+    lines[:, 0, 0] = center_x - half_widths
+    lines[:, 1, 0] = center_x + half_widths
+    lines[:, :, 1] = line_ys[:, None]
     
     # Draw lines and circles with better visibility
     color = (0, 255, 0)  # Green
     line_thickness = 3
     circle_radius = 8
     
-    # Draw horizontal measurement lines
-    cv2.line(annotated, left_shoulder, right_shoulder, color, line_thickness)
-    cv2.line(annotated, left_bust, right_bust, color, line_thickness)
-    cv2.line(annotated, left_waist, right_waist, color, line_thickness)
-    cv2.line(annotated, left_hip, right_hip, color, line_thickness)
+    # Draw all horizontal measurement lines in one call
+    cv2.polylines(annotated, lines, False, color, line_thickness)
     
     # Draw circles at measurement points
-    for point in [left_shoulder, right_shoulder, left_bust, right_bust, 
-                  left_waist, right_waist, left_hip, right_hip]:
-        cv2.circle(annotated, point, circle_radius, color, -1)
+    circle = cv2.circle
+    for point in map(tuple, lines.reshape(-1, 2).tolist()):
+        circle(annotated, point, circle_radius, color, -1)
         # Add white border for better visibility
-        cv2.circle(annotated, point, circle_radius + 2, (255, 255, 255), 2)
+        circle(annotated, point, circle_radius + 2, (255, 255, 255), 2)
     
     # Add labels
     font = cv2.FONT_HERSHEY_SIMPLEX
@@ -346,155 +561,390 @@ def create_annotated_image(image: np.ndarray, measurements_px: dict) -> str:
         # Text
         cv2.putText(img, text, position, font, font_scale, color, font_thickness)
     
-    # Label each measurement line
-    draw_text_with_bg(annotated, "Shoulders", (center_x + shoulder_width // 2 + 10, shoulder_y))
-    draw_text_with_bg(annotated, "Bust", (center_x + bust_width // 2 + 10, bust_y))
-    draw_text_with_bg(annotated, "Waist", (center_x + waist_width // 2 + 10, waist_y))
-    draw_text_with_bg(annotated, "Hips", (center_x + hip_width // 2 + 10, hip_y))
+    # Label each measurement line to the right of its right endpoint
+    for (label, _, _), (right_x, y) in zip(ANNOTATION_LINES, lines[:, 1].tolist()):
+        draw_text_with_bg(annotated, label, (right_x + 10, y))
     
-    # Convert to base64
-    _, buffer = cv2.imencode('.jpg', annotated)
-    img_base64 = base64.b64encode(buffer).decode('utf-8')
+    # Convert to base64 (JPEG)
+    return encode_image_to_base64(annotated)
+
+
+def create_pose_annotated_image(image: np.ndarray, landmarks: np.ndarray) -> str:
+    """
+    Draw pose landmarks (a landmarks_to_array() result) and connections,
+    returning base64.
     
-    return img_base64
+    Draws on the BGR image directly: MediaPipe already had its own RGB
+    copy and the caller only needs the image shape afterwards.
+    """
+    draw_pose(image, landmarks)
+    return encode_image_to_base64(image)
+
+
+def measure_and_draw_pose(image: np.ndarray, pose_landmarks) -> Tuple[dict, str]:
+    """Pixel measurements and the annotated image (base64) for one detected pose."""
+    # Same proportion-based estimate as /measure; only the drawing uses the landmarks
+    measurements_px = extract_body_measurements_px(image)
+    return measurements_px, create_pose_annotated_image(image, landmarks_to_array(pose_landmarks))
 
 
 # ============================================================================
 # Virtual Try-On Functions (Phase 4)
 # ============================================================================
 
-async def fetch_clothing_image(url: str) -> str:
-    """Fetch clothing image from URL and return as base64."""
-    async with httpx.AsyncClient() as client:
-        try:
-            response = await client.get(url, follow_redirects=True, timeout=30.0)
-            response.raise_for_status()
-            return base64.b64encode(response.content).decode("utf-8")
-        except Exception as e:
-            logger.error(f"Error fetching clothing image: {e}")
-            raise HTTPException(
-                status_code=400, 
-                detail=f"Could not fetch clothing image from URL: {str(e)}"
-            )
+OOTD_BASE_URL = "https://mohamedlkooo-ootddiffusionshofit.hf.space"
+# OOTDiffusion sampling settings sent with every request
+OOTD_N_STEPS = 20
+OOTD_IMAGE_SCALE = 2.0
+# Opt-in: upload raw image bytes (multipart) to /tryon instead of base64
+# JSON to /tryon/base64. Only enable it for a Space whose /tryon takes
+# model_image/garment_image files; if it rejects the upload, the call is
+# retried as base64 and multipart stays off once that retry succeeds
+OOTD_MULTIPART_UPLOAD = os.getenv("OOTD_MULTIPART_UPLOAD", "0").lower() in ("1", "true", "yes")
+_ootd_multipart_supported = OOTD_MULTIPART_UPLOAD
+# OOTDiffusion works at 768x1024, so larger uploads are shrunk before sending
+TRYON_MAX_SIDE = 1024
 
 
-async def call_ootdiffusion_api(person_image_b64: str, clothing_image_b64: str, category: str = "Upper body") -> str:
+def downscale_base64_image(base64_string: str, max_side: int = TRYON_MAX_SIDE) -> str:
+    """
+    Shrink a base64 image so its longest side is at most max_side.
+    
+    Images that already fit are returned unchanged, without re-encoding.
+    PNGs with transparency (garment cut-outs) keep their alpha channel and
+    stay PNG, so they reach the Space the same way whatever their size.
+    """
+    resized = _downscale_image(decode_base64_bytes(base64_string), max_side)
+    return base64_string if resized is None else resized
+
+
+def downscale_image_bytes(image_bytes: bytes, max_side: int = TRYON_MAX_SIDE) -> str:
+    """downscale_base64_image for raw JPEG/PNG bytes; returns base64."""
+    resized = _downscale_image(image_bytes, max_side)
+    return b64encode_str(image_bytes) if resized is None else resized
+
+
+def _downscale_image(image_bytes: bytes, max_side: int) -> Optional[str]:
+    """The image shrunk to max_side as base64, or None if it already fits."""
+    is_png = image_media_type(image_bytes) == "image/png"
+    image = decode_image_bytes(image_bytes, cv2.IMREAD_UNCHANGED if is_png else cv2.IMREAD_COLOR)
+    height, width = image.shape[:2]
+    if max(height, width) <= max_side:
+        return None
+    
+    has_alpha = image.ndim == 3 and image.shape[2] == 4
+    if image.dtype != np.uint8:
+        # 16-bit PNG
+        image = (image >> 8).astype(np.uint8)
+    if image.ndim == 2:
+        image = cv2.cvtColor(image, cv2.COLOR_GRAY2BGR)
+    
+    scale = max_side / max(height, width)
+    resized = cv2.resize(
+        image,
+        (max(1, round(width * scale)), max(1, round(height * scale))),
+        interpolation=cv2.INTER_AREA,
+    )
+    return encode_image_to_base64(resized, lossless=has_alpha, quality=90)
+
+
+def prepare_tryon_image(image: Union[str, bytes]) -> str:
+    """Downscale a base64 string or raw image bytes for try-on, returning base64."""
+    if isinstance(image, str):
+        return downscale_base64_image(image)
+    return downscale_image_bytes(image)
+
+
+class TTLCache:
+    """Small in-process LRU cache whose entries also expire after ttl seconds."""
+    
+    def __init__(self, maxsize: int, ttl: float):
+        self.maxsize = maxsize
+        self.ttl = ttl
+        self._data = OrderedDict()
+    
+    def get(self, key):
+        entry = self._data.get(key)
+        if entry is None:
+            return None
+        expires_at, value = entry
+        if expires_at < time.monotonic():
+            del self._data[key]
+            return None
+        self._data.move_to_end(key)
+        return value
+    
+    def set(self, key, value):
+        self._data[key] = (time.monotonic() + self.ttl, value)
+        self._data.move_to_end(key)
+        while len(self._data) > self.maxsize:
+            self._data.popitem(last=False)
+
+
+# Try-on results keyed by a hash of the inputs: users often retry the same
+# garment, and each upstream call costs 10-30 s of GPU time
+tryon_cache = TTLCache(
+    maxsize=int(os.getenv("TRYON_CACHE_SIZE", "512")),
+    ttl=float(os.getenv("TRYON_CACHE_TTL", "3600")),
+)
+# One lock per in-flight key, so identical concurrent requests share one call
+_tryon_locks: dict = {}
+# Upstream try-on calls allowed at once; the Space serves only a few at a
+# time, so extra requests are turned away instead of piling up
+TRYON_CONCURRENCY = max(1, int(os.getenv("TRYON_CONCURRENCY", "2")))
+_tryon_slots = asyncio.Semaphore(TRYON_CONCURRENCY)
+# Walking-video calls get their own slots: one can run for minutes and
+# must not hold back try-ons
+VIDEO_CONCURRENCY = max(1, int(os.getenv("VIDEO_CONCURRENCY", "1")))
+_video_slots = asyncio.Semaphore(VIDEO_CONCURRENCY)
+# Product images fetched by URL, already downscaled for try-on. The catalog
+# is small and users retry the same products, so most fetches are repeats
+clothing_cache = TTLCache(maxsize=128, ttl=3600)
+
+
+def _tryon_cache_key(person_image_b64: str, clothing_image_b64: str, category: str) -> str:
+    digest = hashlib.sha256()
+    for part in (person_image_b64, clothing_image_b64, category, f"{OOTD_N_STEPS}|{OOTD_IMAGE_SCALE}"):
+        digest.update(part.encode())
+        digest.update(b"|")
+    return digest.hexdigest()
+
+async def check_hf_token(client: httpx.AsyncClient) -> Optional[str]:
+    """Log whether HUGGINGFACE_API_TOKEN is valid; returns the HF user name, if any."""
+    hf_token = os.getenv("HUGGINGFACE_API_TOKEN")
+    if not hf_token:
+        return None
+    try:
+        whoami = await client.get(
+            "https://huggingface.co/api/whoami-v2",
+            headers={"Authorization": f"Bearer {hf_token}"},
+        )
+        logger.info(f"HF whoami status: {whoami.status_code}")
+        if whoami.status_code == 200:
+            name = whoami.json().get("name")
+            logger.info(f"HF user: {name}")
+            return name
+        logger.warning(f"HF token invalid: {whoami.text[:200]}")
+    except Exception as e:
+        logger.warning(f"HF token check failed: {e}")
+    return None
+
+
+async def fetch_clothing_image(client: httpx.AsyncClient, url: str) -> bytes:
+    """Fetch clothing image from URL and return the raw image bytes."""
+    try:
+        response = await client.get(url, follow_redirects=True, timeout=30.0)
+        response.raise_for_status()
+        return response.content
+    except Exception as e:
+        logger.error(f"Error fetching clothing image: {e}")
+        raise HTTPException(
+            status_code=400, 
+            detail=f"Could not fetch clothing image from URL: {str(e)}"
+        )
+
+
+def _multipart_image(name: str, image_b64: str) -> tuple:
+    """(filename, bytes, content type) file part for a base64 image."""
+    image_bytes = base64.b64decode(image_b64)
+    media_type = image_media_type(image_bytes)
+    extension = "png" if media_type == "image/png" else "jpg"
+    return f"{name}.{extension}", image_bytes, media_type
+
+
+async def call_ootdiffusion_api(client: httpx.AsyncClient, person_image_b64: str, clothing_image_b64: str, category: str = "Upper body") -> str:
     """
     Call OOTDiffusion API on Hugging Face Space for virtual try-on.
     API: https://mohamedlkooo-ootddiffusionshofit.hf.space/tryon
+    
+    Images go to the /tryon/base64 JSON endpoint. With OOTD_MULTIPART_UPLOAD
+    they are uploaded to /tryon as raw JPEG/PNG bytes instead, which is a
+    third smaller, falling back to base64 if the Space rejects the upload.
     """
-    api_url = "https://mohamedlkooo-ootddiffusionshofit.hf.space/tryon/base64"
+    global _ootd_multipart_supported
+    api_url = f"{OOTD_BASE_URL}/tryon"
     
     logger.info(f"Calling OOTDiffusion API at {api_url}")
     logger.info(f"Category: {category}")
     
-    # Prepare base64 request payload
-    payload = {
-        "model_image": person_image_b64,
-        "garment_image": clothing_image_b64,
+    settings = {
         "category": category,
         "n_samples": 1,
-        "n_steps": 20,
-        "image_scale": 2.0,
+        "n_steps": OOTD_N_STEPS,
+        "image_scale": OOTD_IMAGE_SCALE,
         "seed": -1,
     }
     
     # Get HuggingFace token if available
     headers = {}
     hf_token = os.getenv("HUGGINGFACE_API_TOKEN")
-    api_url_with_token = api_url
+    params = None
     if hf_token:
         headers["Authorization"] = f"Bearer {hf_token}"
         headers["X-Auth-Token"] = hf_token
-        api_url_with_token = f"{api_url}?token={hf_token}"
+        params = {"token": hf_token}
         logger.info("Using HuggingFace authentication token")
     else:
         logger.warning("No HUGGINGFACE_API_TOKEN found - may hit quota limits")
     
-    async with httpx.AsyncClient(timeout=120.0) as client:
-        try:
-            if headers.get("Authorization"):
-                try:
-                    whoami = await client.get(
-                        "https://huggingface.co/api/whoami-v2",
-                        headers=headers,
-                    )
-                    logger.info(f"HF whoami status: {whoami.status_code}")
-                    if whoami.status_code == 200:
-                        logger.info(f"HF user: {whoami.json().get('name')}")
-                    else:
-                        logger.warning(f"HF token invalid: {whoami.text[:200]}")
-                except Exception as e:
-                    logger.warning(f"HF token check failed: {e}")
-
-            logger.info("Sending request to OOTDiffusion API with base64 payload...")
+    try:
+        response = None
+        multipart_rejected = False
+        if _ootd_multipart_supported:
+            logger.info("Sending request to OOTDiffusion API with multipart upload...")
+            # Decoding multi-MB base64 is CPU-bound, so keep it off the event loop
+            person_part, garment_part = await asyncio.gather(
+                asyncio.to_thread(_multipart_image, "person", person_image_b64),
+                asyncio.to_thread(_multipart_image, "garment", clothing_image_b64),
+            )
             response = await client.post(
-                api_url_with_token,
-                json=payload,
+                api_url,
+                params=params,
+                files={"model_image": person_part, "garment_image": garment_part},
+                data={key: str(value) for key, value in settings.items()},
                 headers=headers,
             )
-            
-            logger.info(f"Response status: {response.status_code}")
-            
-            # Log response body for debugging
-            if response.status_code != 200:
-                response_text = response.text
-                logger.error(f"Error response body: {response_text[:500]}")  # First 500 chars
-            
-            if response.status_code == 422:
-                # Log validation error details
-                error_detail = response.text
-                logger.error(f"Validation error (422): {error_detail}")
-                raise HTTPException(
-                    status_code=422,
-                    detail=f"Invalid request format: {error_detail}"
-                )
-            
-            if response.status_code == 503:
-                # Model is loading
-                logger.warning("Model is loading, returning None")
-                return None
-            
-            response.raise_for_status()
-            
-            # Parse response
-            result = response.json()
-            logger.info(f"API response received: success={result.get('success')}")
-            
-            if result.get("success") is False:
-                logger.error(f"API returned success=false: {result.get('message')}")
-                raise HTTPException(
-                    status_code=500,
-                    detail=result.get("message", "Virtual try-on failed")
-                )
-            
-            # Return the base64 image (support multiple keys)
-            image_b64 = result.get("image") or result.get("result_image_base64") or result.get("output")
-            if image_b64:
-                logger.info("✅ Virtual try-on image generated successfully")
-                return image_b64
-            else:
-                logger.error("No image in API response")
-                raise HTTPException(
-                    status_code=500,
-                    detail="No image returned from virtual try-on API"
-                )
-            
-        except httpx.HTTPStatusError as e:
-            logger.error(f"OOTDiffusion API error: {e}")
+            if response.is_client_error:
+                logger.warning(f"Multipart try-on upload rejected ({response.status_code}), retrying with base64 payload")
+                multipart_rejected = True
+                response = None
+        
+        if response is None:
+            logger.info("Sending request to OOTDiffusion API with base64 payload...")
+            payload = {"model_image": person_image_b64, "garment_image": clothing_image_b64, **settings}
+            # orjson serializes the multi-MB base64 strings much faster than
+            # the stdlib json httpx would use for json=
+            response = await client.post(
+                f"{api_url}/base64",
+                params=params,
+                content=orjson.dumps(payload),
+                headers={**headers, "Content-Type": "application/json"},
+            )
+        
+        logger.info(f"Response status: {response.status_code}")
+        
+        if multipart_rejected and response.is_success:
+            logger.info("Base64 try-on upload works where multipart doesn't, using it from now on")
+            _ootd_multipart_supported = False
+        
+        # Log response body for debugging
+        if response.status_code != 200:
+            response_text = response.text
+            logger.error(f"Error response body: {response_text[:500]}")  # First 500 chars
+        
+        if response.status_code == 422:
+            # Log validation error details
+            error_detail = response.text
+            logger.error(f"Validation error (422): {error_detail}")
             raise HTTPException(
-                status_code=502,
-                detail=f"Virtual try-on service error: {str(e)}"
+                status_code=422,
+                detail=f"Invalid request format: {error_detail}"
             )
-        except Exception as e:
-            logger.error(f"Error calling OOTDiffusion: {e}")
+        
+        if response.status_code == 503:
+            # Model is loading
+            logger.warning("Model is loading, returning None")
+            return None
+        
+        response.raise_for_status()
+        
+        # The upload endpoint may answer with the image itself
+        if response.headers.get("content-type", "").startswith("image/"):
+            logger.info("✅ Virtual try-on image generated successfully")
+            return b64encode_str(response.content)
+        
+        # Parse response
+        result = orjson.loads(response.content)
+        logger.info(f"API response received: success={result.get('success')}")
+        
+        if result.get("success") is False:
+            logger.error(f"API returned success=false: {result.get('message')}")
             raise HTTPException(
                 status_code=500,
-                detail=f"Virtual try-on failed: {str(e)}"
+                detail=result.get("message", "Virtual try-on failed")
             )
+        
+        # Return the base64 image (support multiple keys)
+        image_b64 = result.get("image") or result.get("result_image_base64") or result.get("output")
+        if image_b64:
+            logger.info("✅ Virtual try-on image generated successfully")
+            return image_b64
+        else:
+            logger.error("No image in API response")
+            raise HTTPException(
+                status_code=500,
+                detail="No image returned from virtual try-on API"
+            )
+        
+    except httpx.HTTPStatusError as e:
+        logger.error(f"OOTDiffusion API error: {e}")
+        raise HTTPException(
+            status_code=502,
+            detail=f"Virtual try-on service error: {str(e)}"
+        )
+    except Exception as e:
+        logger.error(f"Error calling OOTDiffusion: {e}")
+        raise HTTPException(
+            status_code=500,
+            detail=f"Virtual try-on failed: {str(e)}"
+        )
 
 
-async def call_hunyuan_video_api(image_b64: str) -> str:
+@asynccontextmanager
+async def upstream_slot(slots: asyncio.Semaphore, service: str):
+    """Hold one of the given upstream slots, or fail fast with 503."""
+    if slots.locked():
+        raise HTTPException(
+            status_code=503,
+            detail=f"{service} is busy. Please try again in a moment.",
+            headers={"Retry-After": "10"},
+        )
+    # Not locked, so this acquires without waiting
+    async with slots:
+        yield
+
+
+def tryon_slot():
+    """Hold one of the TRYON_CONCURRENCY upstream slots, or fail fast with 503."""
+    return upstream_slot(_tryon_slots, "Virtual try-on")
+
+
+async def call_ootdiffusion_api_cached(client: httpx.AsyncClient, person_image_b64: str, clothing_image_b64: str, category: str = "Upper body", key: Optional[str] = None) -> str:
+    """
+    call_ootdiffusion_api behind tryon_cache.
+    
+    Concurrent requests for the same inputs wait on a per-key lock and are
+    answered from the cache once the first call finishes. Results are
+    only cached when the call succeeds. Pass key if the caller already
+    computed _tryon_cache_key. Only cache misses take a tryon_slot.
+    """
+    if key is None:
+        key = _tryon_cache_key(person_image_b64, clothing_image_b64, category)
+    result = tryon_cache.get(key)
+    if result is not None:
+        logger.info("Virtual try-on served from cache")
+        return result
+    
+    # [lock, requests holding or waiting on it]; the entry lives until the
+    # last of them is done, so later duplicates queue on the same lock
+    entry = _tryon_locks.setdefault(key, [asyncio.Lock(), 0])
+    entry[1] += 1
+    try:
+        async with entry[0]:
+            result = tryon_cache.get(key)
+            if result is None:
+                async with tryon_slot():
+                    result = await call_ootdiffusion_api(client, person_image_b64, clothing_image_b64, category)
+                if result:
+                    tryon_cache.set(key, result)
+            return result
+    finally:
+        entry[1] -= 1
+        if entry[1] == 0:
+            del _tryon_locks[key]
+
+
+async def call_hunyuan_video_api(client: httpx.AsyncClient, image_b64: str) -> str:
     """
     Call HunyuanVideo API on Hugging Face to generate a walking video.
     
@@ -524,25 +974,24 @@ async def call_hunyuan_video_api(image_b64: str) -> str:
         }
     }
     
-    async with httpx.AsyncClient() as client:
-        try:
-            response = await client.post(
-                api_url,
-                headers=headers,
-                json=payload,
-                timeout=300.0  # Video generation takes longer
-            )
-            
-            if response.status_code != 200:
-                logger.warning(f"HunyuanVideo not available: {response.status_code}")
-                return None
-            
-            result = response.json()
-            return result.get("video_url", None)
-            
-        except Exception as e:
-            logger.warning(f"Video generation not available: {e}")
+    try:
+        response = await client.post(
+            api_url,
+            headers=headers,
+            content=orjson.dumps(payload),
+            timeout=300.0  # Video generation takes longer
+        )
+        
+        if response.status_code != 200:
+            logger.warning(f"HunyuanVideo not available: {response.status_code}")
             return None
+        
+        result = orjson.loads(response.content)
+        return result.get("video_url", None)
+        
+    except Exception as e:
+        logger.warning(f"Video generation not available: {e}")
+        return None
 
 
 # ============================================================================
@@ -576,17 +1025,33 @@ async def measure_body(request: MeasurementRequest):
     """
     logger.info("Processing measurement request...")
     
-    # Decode the image
-    image = decode_base64_image(request.image_base64)
-    
+    # Decode the image (CPU-bound, so keep it off the event loop)
+    image = await asyncio.to_thread(decode_base64_image, request.image_base64)
+    return await measure_image(image, request.height_cm)
+
+
+@app.post("/measure/upload", response_model=MeasurementResponse)
+async def measure_body_upload(
+    image: UploadFile = File(..., description="Full-body front image (JPEG/PNG)"),
+    height_cm: float = Form(..., gt=0, description="User's height in centimeters"),
+):
+    """Same as /measure, but takes the image as a multipart upload instead of base64."""
+    logger.info("Processing measurement upload...")
+    decoded = await asyncio.to_thread(decode_image_bytes, await read_upload(image))
+    return await measure_image(decoded, height_cm)
+
+
+async def measure_image(image: np.ndarray, height_cm: float) -> MeasurementResponse:
+    """Shared body of /measure and /measure/upload for a decoded image."""
     # Extract measurements in pixels
     measurements_px = extract_body_measurements_px(image)
     
     # Convert to centimeters
-    measurements_cm = convert_pixels_to_cm(measurements_px, request.height_cm)
+    measurements_cm = convert_pixels_to_cm(measurements_px, height_cm)
     
-    # Create annotated image with measurement points
-    annotated_image_b64 = create_annotated_image(image, measurements_px)
+    # Create annotated image with measurement points; the decoded image has
+    # no other consumer past this point, so draw on it directly
+    annotated_image_b64 = await asyncio.to_thread(create_annotated_image, image, measurements_px, inplace=True)
     
     # Create response with annotated image
     response = MeasurementResponse(**measurements_cm, annotated_image=annotated_image_b64)
@@ -607,36 +1072,64 @@ async def virtual_tryon(request: VirtualTryOnRequest):
     logger.info(f"Request has person_image_base64: {len(request.person_image_base64) if request.person_image_base64 else 0} chars")
     logger.info(f"Request has clothing_image_base64: {len(request.clothing_image_base64) if request.clothing_image_base64 else 0} chars")
     
-    # Get clothing image
-    if request.clothing_image_base64:
-        clothing_b64 = request.clothing_image_base64
-    else:
-        # Try to extract clothing image from URL
-        # In a real implementation, you'd scrape the product image
-        clothing_b64 = await fetch_clothing_image(request.clothing_url)
-    
-    # Remove data URL prefix if present
-    person_b64 = request.person_image_base64
-    if "," in person_b64:
-        person_b64 = person_b64.split(",")[1]
-    
-    if clothing_b64 and "," in clothing_b64:
-        clothing_b64 = clothing_b64.split(",")[1]
+    # Remove data URL prefixes if present
+    return await run_virtual_tryon(
+        strip_data_url_prefix(request.person_image_base64),
+        strip_data_url_prefix(request.clothing_image_base64) if request.clothing_image_base64 else None,
+        request.clothing_url,
+        request.category,
+    )
+
+
+async def run_virtual_tryon(
+    person_image: Union[str, bytes],
+    clothing_image: Optional[Union[str, bytes]],
+    clothing_url: str,
+    category: str,
+) -> VirtualTryOnResponse:
+    """
+    Shared body of /virtual-tryon and /virtual-tryon/upload.
     
-    logger.info(f"After processing - person_b64: {len(person_b64) if person_b64 else 0} chars")
-    logger.info(f"After processing - clothing_b64: {len(clothing_b64) if clothing_b64 else 0} chars")
+    Images are bare base64 strings (JSON endpoint) or raw bytes (uploads);
+    raw bytes are decoded directly, without a base64 round trip.
+    """
+    client = app.state.http
+    has_clothing = bool(clothing_image or clothing_url)
     
-    if not person_b64 or not clothing_b64:
+    if not person_image or not has_clothing:
         raise HTTPException(
             status_code=400,
-            detail=f"Missing images: person={'OK' if person_b64 else 'MISSING'}, clothing={'OK' if clothing_b64 else 'MISSING'}"
+            detail=f"Missing images: person={'OK' if person_image else 'MISSING'}, clothing={'OK' if has_clothing else 'MISSING'}"
         )
     
-    # Get category from request or default to "Upper body"
-    category = getattr(request, 'category', 'Upper body')
+    async def prepare_clothing() -> str:
+        if clothing_image:
+            return await asyncio.to_thread(prepare_tryon_image, clothing_image)
+        
+        # Try to extract clothing image from URL
+        # In a real implementation, you'd scrape the product image.
+        url = clothing_url.strip()
+        clothing_b64 = clothing_cache.get(url)
+        if clothing_b64 is None:
+            image_bytes = await fetch_clothing_image(client, url)
+            clothing_b64 = await asyncio.to_thread(downscale_image_bytes, image_bytes)
+            clothing_cache.set(url, clothing_b64)
+        return clothing_b64
+    
+    # Fetch the clothing while the person image is prepared. Phone photos are
+    # far larger than the model's input; shrinking them here cuts upload size
+    # and the Space's own preprocessing time
+    person_b64, clothing_b64 = await asyncio.gather(
+        asyncio.to_thread(prepare_tryon_image, person_image),
+        prepare_clothing(),
+    )
+    
+    logger.info(f"After processing - person_b64: {len(person_b64)} chars")
+    logger.info(f"After processing - clothing_b64: {len(clothing_b64)} chars")
     
     # Call OOTDiffusion for virtual try-on
-    try_on_result = await call_ootdiffusion_api(person_b64, clothing_b64, category)
+    result_id = _tryon_cache_key(person_b64, clothing_b64, category)
+    try_on_result = await call_ootdiffusion_api_cached(client, person_b64, clothing_b64, category, key=result_id)
     
     if not try_on_result:
         raise HTTPException(
@@ -644,61 +1137,132 @@ async def virtual_tryon(request: VirtualTryOnRequest):
             detail="Virtual try-on service is currently loading. Please try again in a moment."
         )
     
-    # Generate walking video (optional)
-    video_url = await call_hunyuan_video_api(try_on_result)
+    # Generate walking video (optional; skipped rather than failed when busy)
+    video_url = None
+    try:
+        async with upstream_slot(_video_slots, "Video generation"):
+            video_url = await call_hunyuan_video_api(client, try_on_result)
+    except HTTPException:
+        logger.info("Skipping walking video: video slots are busy")
     
     return VirtualTryOnResponse(
         result_image_base64=try_on_result,
+        result_id=result_id,
         video_url=video_url,
         message="Virtual try-on completed successfully!"
     )
 
 
+@app.post("/virtual-tryon/upload", response_model=VirtualTryOnResponse)
+async def virtual_tryon_upload(
+    person_image: UploadFile = File(..., description="Person image (JPEG/PNG)"),
+    clothing_image: Optional[UploadFile] = File(None, description="Clothing image (optional)"),
+    clothing_url: str = Form(default="", description="URL of the clothing item"),
+    category: str = Form(default="Upper body", description="Garment category: 'Upper body', 'Lower body', or 'Dress'"),
+):
+    """
+    Same as /virtual-tryon, but takes the images as multipart uploads.
+    
+    Saves the client the base64 step and a third of the upload size. The
+    uploads are decoded as-is; only the (downscaled) images sent upstream
+    are base64-encoded, in a worker thread.
+    """
+    logger.info("Processing virtual try-on upload...")
+    person_bytes = await read_upload(person_image)
+    clothing_bytes = await read_upload(clothing_image) if clothing_image else None
+    return await run_virtual_tryon(person_bytes, clothing_bytes, clothing_url, category)
+
+
+@app.get("/virtual-tryon/{result_id}/image")
+async def get_tryon_image(result_id: str):
+    """
+    Return a recent try-on result as raw image bytes.
+    
+    Lets clients render the image directly (e.g. as an <img> URL) instead
+    of decoding result_image_base64. Results stay available for
+    TRYON_CACHE_TTL seconds.
+    """
+    result = tryon_cache.get(result_id)
+    if result is None:
+        raise HTTPException(status_code=404, detail="Try-on result not found or expired")
+    
+    image_bytes = base64.b64decode(strip_data_url_prefix(result))
+    return Response(content=image_bytes, media_type=image_media_type(image_bytes))
+
+
 @app.post("/analyze-pose")
 async def analyze_pose(request: MeasurementRequest):
     """
     Analyze pose landmarks and return visualization.
     Useful for debugging and understanding the pose detection.
     """
-    image = decode_base64_image(request.image_base64)
-    
-    with mp_pose.Pose(
-        static_image_mode=True,
-        model_complexity=2,
-        enable_segmentation=True,
-        min_detection_confidence=0.5
-    ) as pose:
-        image_rgb = cv2.cvtColor(image, cv2.COLOR_BGR2RGB)
-        results = pose.process(image_rgb)
-        
-        if not results.pose_landmarks:
-            raise HTTPException(
-                status_code=400,
-                detail="Could not detect pose in image."
+    require_pose_detection()
+    image_bytes = await asyncio.to_thread(decode_base64_bytes, request.image_base64)
+    return await analyze_pose_bytes(image_bytes, request.height_cm)
+
+
+@app.post("/analyze-pose/upload")
+async def analyze_pose_upload(
+    image: UploadFile = File(..., description="Full-body front image (JPEG/PNG)"),
+    height_cm: float = Form(..., gt=0, description="User's height in centimeters"),
+):
+    """Same as /analyze-pose, but takes the image as a multipart upload instead of base64."""
+    require_pose_detection()
+    return await analyze_pose_bytes(await read_upload(image), height_cm)
+
+
+def require_pose_detection() -> None:
+    """Fail with 503 when neither the landmarker pool nor the pose workers are up."""
+    if getattr(app.state, "pose_pool", None) is None and getattr(app.state, "pose_processes", None) is None:
+        raise pose_unavailable_error()
+
+
+def pose_unavailable_error() -> HTTPException:
+    return HTTPException(
+        status_code=503,
+        detail="Pose detection is unavailable. Check the MediaPipe install and POSE_MODEL_PATH."
+    )
+
+
+async def analyze_pose_bytes(image_bytes: bytes, height_cm: float) -> dict:
+    """Shared body of /analyze-pose and /analyze-pose/upload for an encoded image."""
+    pose_processes = getattr(app.state, "pose_processes", None)
+    if pose_processes is not None:
+        try:
+            result = await asyncio.get_running_loop().run_in_executor(
+                pose_processes, analyze_pose_in_worker, image_bytes
             )
-        
-        # Draw landmarks on image
-        annotated_image = image.copy()
-        mp_drawing.draw_landmarks(
-            annotated_image,
-            results.pose_landmarks,
-            mp_pose.POSE_CONNECTIONS,
-            mp_drawing.DrawingSpec(color=(0, 255, 0), thickness=2, circle_radius=2),
-            mp_drawing.DrawingSpec(color=(255, 0, 0), thickness=2)
+        except ValueError as e:
+            raise HTTPException(status_code=400, detail=f"Invalid image data: {e}")
+        except (BrokenProcessPool, PoseUnavailableError) as e:
+            logger.error(f"Pose worker unavailable: {e}")
+            raise pose_unavailable_error()
+        if result is not None:
+            (height, width), annotated = result
+            # Same estimate as extract_body_measurements_px, from the worker's image size
+            measurements_px, _, _ = _frame_geometry(height, width)
+            result = dict(measurements_px), b64encode_str(annotated)
+    else:
+        image = await asyncio.to_thread(decode_image_bytes, image_bytes)
+        results = await app.state.pose_pool.detect(image)
+        result = None
+        if results.pose_landmarks:
+            result = await asyncio.to_thread(measure_and_draw_pose, image, results.pose_landmarks[0])
+    
+    if result is None:
+        raise HTTPException(
+            status_code=400,
+            detail="Could not detect pose in image."
         )
-        
-        # Encode annotated image
-        annotated_b64 = encode_image_to_base64(annotated_image)
-        
-        # Get measurements
-        measurements_px = extract_body_measurements_px(image)
-        measurements_cm = convert_pixels_to_cm(measurements_px, request.height_cm)
-        
-        return {
-            "annotated_image_base64": annotated_b64,
-            "measurements_px": measurements_px,
-            "measurements_cm": measurements_cm,
-        }
+    
+    measurements_px, annotated_b64 = result
+    measurements_cm = convert_pixels_to_cm(measurements_px, height_cm)
+    
+    return {
+        "annotated_image_base64": annotated_b64,
+        "measurements_px": measurements_px,
+        "measurements_cm": measurements_cm,
+    }
 
 
 # ============================================================================
@@ -3,6 +3,7 @@ Authentication routes for ShoFit backend
 """
 
 from fastapi import APIRouter, HTTPException
+from fastapi.concurrency import run_in_threadpool
 from pydantic import BaseModel, EmailStr, Field
 from database import db
 
@@ -52,7 +53,7 @@ async def signup(request: SignupRequest):
         HTTPException: If email already exists
     """
     # Check if user already exists
-    existing_user = db.get_user_by_email(request.email)
+    existing_user = await run_in_threadpool(db.get_user_by_email, request.email)
     if existing_user:
         raise HTTPException(
             status_code=400,
@@ -60,7 +61,7 @@ async def signup(request: SignupRequest):
         )
     
     # Create new user
-    user = db.create_user(request.email, request.name, request.password)
+    user = await run_in_threadpool(db.create_user, request.email, request.name, request.password)
     if not user:
         raise HTTPException(
             status_code=500,
@@ -88,7 +89,7 @@ async def login(request: LoginRequest):
     Raises:
         HTTPException: If credentials are invalid
     """
-    user = db.verify_user(request.email, request.password)
+    user = await run_in_threadpool(db.verify_user, request.email, request.password)
     
     if not user:
         raise HTTPException(
@@ -117,7 +118,7 @@ async def get_user(email: str):
     Raises:
         HTTPException: If user not found
     """
-    user = db.get_user_by_email(email)
+    user = await run_in_threadpool(db.get_user_by_email, email)
     
     if not user:
         raise HTTPException(
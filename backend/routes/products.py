@@ -2,91 +2,212 @@
 Product routes for ShoFit backend
 """
 
-from fastapi import APIRouter, HTTPException, Query
-from typing import Optional
+import gzip
+import hashlib
+
+from fastapi import APIRouter, HTTPException, Query, Request
+from fastapi.concurrency import run_in_threadpool
+from fastapi.responses import Response, StreamingResponse
+from pydantic import BaseModel
+from typing import Dict, List, Optional, Tuple
 from models import Product, ProductResponse, ProductsListResponse, ProductsFilterRequest
 from database import db
 
 router = APIRouter(prefix="/api/products", tags=["products"])
 
+# Serialized unfiltered/per-category listings for the current catalog
+# generation: (generation, category) -> (count, JSON body, ETag, gzipped body)
+_listing_cache: Dict[Tuple[int, Optional[str]], Tuple[int, bytes, str, Optional[bytes]]] = {}
+
+# Serialized single products, same scheme: (generation, id) -> (JSON body, ETag)
+_product_cache: Dict[Tuple[int, str], Tuple[bytes, str]] = {}
+
+
+# Bodies smaller than this are sent uncompressed
+GZIP_MIN_SIZE = 512
+
+
+def _etag(body: bytes) -> str:
+    return '"' + hashlib.sha1(body).hexdigest() + '"'
+
+
+def _gzip(body: bytes) -> Optional[bytes]:
+    """Gzip a JSON body, or None if it's too small to be worth it"""
+    if len(body) < GZIP_MIN_SIZE:
+        return None
+    return gzip.compress(body, compresslevel=6, mtime=0)
+
+
+def _accepts_gzip(request: Request) -> bool:
+    return "gzip" in request.headers.get("accept-encoding", "").lower()
+
+
+def _store(cache: dict, generation: int, key, value) -> None:
+    """Add an entry, dropping everything cached for older generations"""
+    if any(cached_generation != generation for cached_generation, _ in list(cache)):
+        cache.clear()
+    cache[(generation, key)] = value
+
+
+def _cached_listing(category: Optional[str] = None) -> Tuple[int, bytes, str, Optional[bytes]]:
+    """Validate, serialize and compress a full listing once per catalog change"""
+    # Read the generation first: if the catalog changes while we build, the
+    # entry lands under the old generation and is simply never used
+    generation = db.products_generation()
+    key = category.lower() if category else None
+    cached = _listing_cache.get((generation, key))
+    if cached is None:
+        products = db.get_products(category=category) if category else db.get_all_products()
+        body = ProductsListResponse(success=True, count=len(products), data=products).model_dump_json().encode()
+        cached = (len(products), body, _etag(body), _gzip(body))
+        # Empty categories aren't cached, so arbitrary names can't grow the cache
+        if products or key is None:
+            _store(_listing_cache, generation, key, cached)
+    return cached
+
+
+def _cached_product(product_id: str) -> Optional[Tuple[bytes, str]]:
+    """Serialize a single product once per catalog change; None if missing"""
+    generation = db.products_generation()
+    cached = _product_cache.get((generation, product_id))
+    if cached is None:
+        product = db.get_product_by_id(product_id)
+        if not product:
+            # Misses aren't cached, so arbitrary ids can't grow the cache
+            return None
+        body = ProductResponse(success=True, data=product).model_dump_json().encode()
+        cached = (body, _etag(body))
+        _store(_product_cache, generation, product_id, cached)
+    return cached
+
+
+def _model_response(model: BaseModel) -> Response:
+    """Serialize an already-validated response model without re-validating it"""
+    return Response(content=model.model_dump_json(), media_type="application/json")
+
+
+def _json_response(
+    request: Request,
+    body: bytes,
+    etag: Optional[str] = None,
+    gzipped: Optional[bytes] = None,
+) -> Response:
+    """
+    Send a JSON body, gzipped if the client accepts it and a compressed copy
+    is given. With an ETag, answers a matching If-None-Match with 304.
+    """
+    headers = {}
+    if gzipped is not None:
+        headers["Vary"] = "Accept-Encoding"
+        if _accepts_gzip(request):
+            body = gzipped
+            headers["Content-Encoding"] = "gzip"
+            if etag:
+                # Each encoding is a different representation, so a different tag
+                etag = etag[:-1] + '-gzip"'
+    if etag:
+        # no-cache: clients may keep the body but must revalidate, so catalog
+        # edits show up on the next request
+        headers["ETag"] = etag
+        headers["Cache-Control"] = "no-cache"
+        if_none_match = request.headers.get("if-none-match")
+        if if_none_match and (
+            if_none_match.strip() == "*"
+            or etag in (tag.strip().removeprefix("W/") for tag in if_none_match.split(","))
+        ):
+            return Response(status_code=304, headers=headers)
+    return Response(content=body, media_type="application/json", headers=headers)
+
 
 @router.get("/", response_model=ProductsListResponse)
 async def get_all_products(
+    request: Request,
     category: Optional[str] = Query(None, description="Filter by category"),
     min_price: Optional[float] = Query(None, ge=0, description="Minimum price"),
     max_price: Optional[float] = Query(None, ge=0, description="Maximum price"),
     search: Optional[str] = Query(None, description="Search by name or brand"),
+    offset: int = Query(0, ge=0, description="Number of products to skip"),
+    limit: Optional[int] = Query(None, ge=1, le=100, description="Maximum number of products to return"),
 ):
     """
-    Get all products with optional filtering.
+    Get all products with optional filtering and pagination.
     """
-    products = db.get_all_products()
+    if not (category or search or offset or limit is not None
+            or min_price is not None or max_price is not None):
+        _, body, etag, gzipped = await run_in_threadpool(_cached_listing)
+        return _json_response(request, body, etag, gzipped)
     
-    # Apply filters
-    if category:
-        products = [p for p in products if p["category"].lower() == category.lower()]
+    products = await run_in_threadpool(
+        db.get_products,
+        offset=offset,
+        limit=limit,
+        category=category,
+        min_price=min_price,
+        max_price=max_price,
+        search=search,
+    )
     
-    if min_price is not None:
-        products = [p for p in products if p["price"] >= min_price]
-    
-    if max_price is not None:
-        products = [p for p in products if p["price"] <= max_price]
-    
-    if search:
-        search_lower = search.lower()
-        products = [
-            p for p in products
-            if search_lower in p["name"].lower() or search_lower in p["brand"].lower()
-        ]
-    
-    return ProductsListResponse(success=True, count=len(products), data=products)
+    body = ProductsListResponse(success=True, count=len(products), data=products).model_dump_json().encode()
+    return _json_response(request, body, gzipped=_gzip(body) if _accepts_gzip(request) else None)
+
+
+@router.get("/stream")
+async def stream_products():
+    """Stream all products as newline-delimited JSON, one product per line."""
+    lines = (f"{product}\n" for product in db.iter_products())
+    return StreamingResponse(lines, media_type="application/x-ndjson")
 
 
 @router.get("/{product_id}", response_model=ProductResponse)
-async def get_product(product_id: str):
+async def get_product(product_id: str, request: Request):
     """Get a single product by ID."""
-    product = db.get_product_by_id(product_id)
+    cached = await run_in_threadpool(_cached_product, product_id)
     
-    if not product:
+    if not cached:
         raise HTTPException(
             status_code=404,
             detail=f"Product with id '{product_id}' not found"
         )
     
-    return ProductResponse(success=True, data=product)
+    return _json_response(request, *cached)
 
 
 @router.get("/category/{category}", response_model=ProductsListResponse)
-async def get_products_by_category(category: str):
+async def get_products_by_category(category: str, request: Request):
     """Get all products in a specific category."""
-    products = db.get_all_products()
-    products = [
-        p for p in products
-        if p["category"].lower() == category.lower()
-    ]
+    count, body, etag, gzipped = await run_in_threadpool(_cached_listing, category)
     
-    if not products:
+    if not count:
         raise HTTPException(
             status_code=404,
             detail=f"No products found in category '{category}'"
         )
     
-    return ProductsListResponse(success=True, count=len(products), data=products)
+    return _json_response(request, body, etag, gzipped)
 
 
 @router.post("/", response_model=ProductResponse)
 async def create_product(product: Product):
     """Create a new product (Admin only in production)."""
-    product_dict = product.model_dump()
-    created_product = db.add_product(product_dict)
-    return ProductResponse(success=True, data=created_product)
+    await run_in_threadpool(db.add_product, product.model_dump())
+    # The request body was validated on the way in; model_construct and a raw
+    # Response skip validating it twice more on the way out
+    return _model_response(ProductResponse.model_construct(success=True, data=product))
+
+
+@router.post("/bulk", response_model=ProductsListResponse)
+async def create_products(products: List[Product]):
+    """Create several products in one write (Admin only in production)."""
+    await run_in_threadpool(db.add_products, [product.model_dump() for product in products])
+    return _model_response(ProductsListResponse.model_construct(success=True, count=len(products), data=products))
 
 
 @router.put("/{product_id}", response_model=ProductResponse)
 async def update_product(product_id: str, product: Product):
     """Update an existing product (Admin only in production)."""
-    product_dict = product.model_dump()
-    updated_product = db.update_product(product_id, product_dict)
+    # The path id wins over the body's, as in db.update_product
+    product = product.model_copy(update={"id": product_id})
+    updated_product = await run_in_threadpool(db.update_product, product_id, product.model_dump())
     
     if not updated_product:
         raise HTTPException(
@@ -94,13 +215,13 @@ async def update_product(product_id: str, product: Product):
             detail=f"Product with id '{product_id}' not found"
         )
     
-    return ProductResponse(success=True, data=updated_product)
+    return _model_response(ProductResponse.model_construct(success=True, data=product))
 
 
 @router.delete("/{product_id}")
 async def delete_product(product_id: str):
     """Delete a product (Admin only in production)."""
-    success = db.delete_product(product_id)
+    success = await run_in_threadpool(db.delete_product, product_id)
     
     if not success:
         raise HTTPException(